@@ -3,7 +3,14 @@ import logging
 import regex
 import pandas as pd
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 from unidecode import unidecode
+import numpy as np
+from twitter_data import TwitterData
+from id_store import IdStore, default_store_path, default_text_path
+import near_dups
+import files
+import configs
 
 
 logger = logging.getLogger(__name__)
@@ -20,55 +27,128 @@ logger = logging.getLogger(__name__)
 # def split_
 
 
-def update_ids(dir: Path, id_col: str, data_type: str) -> (int, set):
+# data types whose ids are not integers (place ids are hexadecimal strings)
+_text_id_types = {'places'}
+
+
+def update_ids(dir: Path,
+               id_col: str,
+               data_type: str,
+               workers: int = None,
+               sep: str = '~') -> (int, set):
     """
-    Extract all unique @id entries from all CSV files in @dir and append to
-      respective <@data_type>.txt file in ../lin-que-dropping/data/ids/ .
-      Returns a set of duplicated ids which already existed in the text file.
+    Add all unique @id_col entries from all (possibly compressed) CSV files in
+      @dir to the IdStore of @data_type (see id_store.default_store_path).
+      Returns the set of duplicated ids: ids already in the store, as well as
+      ids repeated within or across the files in @dir.
 
-      NOTE: does not recognize all duplicates; run a dedicated duplicate finder
-        method to ensure unique tokens! The method of identifying duplicates
-        does not look for them in the passed files themselves -- eg. some file
-        A in @dir has x > 1 instances of token id m, m is new to the stored
-        records and will thus be considered unique, and all x entries will
-        bypass the duplicate checker!!!
+    Only the id column is read, as uint64, by several threads at once; a
+      legacy '<@data_type>.txt' id file is imported into the store on first
+      use. Place ids are hexadecimal strings: they are read as text and kept
+      in the '<@data_type>.csv' id file (see id_store.default_text_path).
 
     :param dir:
     :param id_col:
     :param data_type: one of {'tweets', 'users', 'places', 'twitterdata'}
+    :param workers: (optional) files scanned at once; defaults to the
+      cleaning config's parallel.workers
+    :param sep: CSV separator used
     :return: tuple (number new entries, set of duplicated ids (if any))
     """
     if data_type not in {'tweets', 'users', 'places', 'twitterdata'}:
         return None
 
-    conf = u.get_config()
-    id_path = u.get_project_root()/conf['file_paths']['ids']/(data_type + '.txt')
+    if workers is None:
+        workers = configs.read_conf('c')['parallel']['workers']
+
+    text = data_type in _text_id_types
+    if text:
+        id_path = default_text_path(data_type)
+        existing = set(id_path.read_text().replace(',', ' ').split()) \
+            if id_path.is_file() else set()
+        na_ids = len(existing)
+    else:
+        store = IdStore(default_store_path(data_type))
+        na_ids = len(store) # total number ids before update
+    logger.debug(f'Updating "{data_type}" ids; {na_ids} existing')
 
-    with open(id_path, 'r') as f:
-        ids = {i.strip() for i in f.read().split(',')}
+    paths = sorted(f for f in dir.iterdir() if f.is_file())
+    scanned = files.read_concurrently(
+        lambda p: _scan_ids(p, id_col, sep, text), paths, workers
+    )
+
+    # occurrences of every id across all files
+    empty = np.array([], dtype=object if text else np.uint64)
+    ids, inverse = np.unique(
+        np.concatenate([u for u, _ in scanned] + [empty]),
+        return_inverse=True
+    )
+    counts = np.bincount(
+        inverse,
+        weights=np.concatenate([c for _, c in scanned] + [np.array([])]),
+        minlength=len(ids)
+    )
+
+    if text:
+        stored = np.array([i in existing for i in ids], dtype=bool)
+        new_ids = ids[~stored]
+        id_path.parent.mkdir(parents=True, exist_ok=True)
+        id_path.write_text(' '.join(existing.union(new_ids)))
+    else:
+        stored = store.contains(ids)
+        new_ids = store.add(ids[~stored])
+    duplicates = ids[stored | (counts > 1)] # keep track of duplicate entries
+
+    logger.debug(f'{na_ids + len(new_ids)} (+{len(new_ids)}) unique ids after '
+                 f'update. \nFound {len(duplicates)} duplicate ids.')
+
+    return len(new_ids), set(duplicates.astype(str).tolist())
+
+
+def _scan_ids(path: Path, id_col: str, sep: str, text: bool = False) -> tuple:
+    """
+    Read only the @id_col column of CSV @path, as uint64 (or as strings if
+      @text)
+    :return: tuple (unique ids, occurrences of each)
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pcsv
 
-    na_ids = len(ids) # total number ids before update
-    logger.debug(f'Updating "{data_type}" ids; {na_ids} existing')
+    table = pcsv.read_csv(
+        path,
+        parse_options=pcsv.ParseOptions(delimiter=sep, newlines_in_values=True),
+        convert_options=pcsv.ConvertOptions(
+            include_columns=[id_col],
+            column_types={id_col: pa.string() if text else pa.uint64()}
+        )
+    )
+    ids = table.column(id_col).drop_null()
 
-    duplicates = set() # keep track of duplicate entries
-    for f in dir.iterdir():
-        # Series -> unique -> set is significantly faster than Series -> set
-        data = pd.read_csv(f, sep='~', usecols=[id_col])[id_col].astype(str)
-        fids = set(data.unique())
-        dupes = ids.intersection(fids) # identify duplicates
-        duplicates.update(dupes)
+    if text:
+        ids = np.array(ids.to_pylist(), dtype=object)
+    else:
+        ids = ids.to_numpy()
 
-        ids.update(fids)
+    return np.unique(ids, return_counts=True)
 
-    nb_ids = len(ids) # total number of ids after update
-    logger.debug(f'{nb_ids} (+{nb_ids-na_ids}) unique ids after update. '
-                 f'\nFound {len(duplicates)} duplicate ids.')
 
-    with open(id_path, 'w') as f:
-        f.write(','.join(ids))
+def _map_folders(fn, items: list, workers: int = None, **kwargs):
+    """
+    Apply @fn to each of @items on a process pool of @workers (in this
+      process if 1); results are yielded in the order of @items
+    """
+    if workers is None:
+        workers = configs.read_conf('c')['parallel']['workers']
 
-    return nb_ids-na_ids, duplicates
+    if (workers <= 1) or (len(items) <= 1):
+        for item in items:
+            yield fn(item, **kwargs)
+        return
 
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(fn, item, **kwargs) for item in items]
+        for future in futures:
+            yield future.result()
 
 
 def remove_dups_extracted(e_path):
@@ -84,11 +164,16 @@ def folder_dup_clean(
         delete_original=True,
         batch=False,
         batch_size=1000,
-        name_scheme=''):
+        name_scheme='',
+        compression=None,
+        workers: int = None,
+        near_dup_action: str = None):
 
     """
     Find and remove all duplicate entries from CSV files in specified folder.
-    Targeted files must have a standardized name schema
+    Targeted files must have a standardized name schema. Duplicates are only
+    looked for within each folder; dedup.dedup_folders() finds them across
+    all folders, in bounded memory
 
     :param cleaned: already processed/cleaned folders
     :param path: folder path as a Path object
@@ -103,56 +188,68 @@ def folder_dup_clean(
     :param batch_size: if batch=False, batch size for separate files
     :param name_scheme: cleaned CSV file naming scheme, will default to
       @file_identifier otherwise
+    :param compression: (optional) compression of the cleaned CSVs; one of
+      {"gzip", "zstd"} or False, defaults to the general config's. Matched
+      files are decompressed (concurrently) based on their extension
+    :param workers: (optional) folders cleaned at once, each in its own
+      process; defaults to the cleaning config's parallel.workers. A folder's
+      originals are deleted only once its cleaned files are written; folders
+      whose cleaning failed are left untouched, and the first failure is
+      raised once the others are done
+    :param near_dup_action: (optional) what to do with the near-duplicate
+      tweets of each folder (see near_dups.mark_near_dups()): 'flag', 'drop'
+      or False to skip them; defaults to the cleaning config's
+      near_dups.action. Dropped near-duplicates count as duplicates removed
 
     :return: tuple (original tweets, duplicates removed)
     """
+    if near_dup_action is None:
+        near_dup_action = configs.read_conf('c')['near_dups']['action']
+
     logging.info(f'Checking for duplicates in: {path}\n'
                  f'  Identifying duplicates by: {dup_subset}\n'
+                 f'  Near-duplicates: {near_dup_action}\n'
                  f'  Deleting original: {delete_original}\n'
                  f'  Name scheme: {name_scheme}')
 
     original_total = 0
     dup_total = 0
+    failed = []
 
-    for folder in path.iterdir():
+    folders = []
+    for folder in sorted(f for f in path.iterdir() if f.is_dir()):
         if folder in cleaned:
             logging.debug(f'{folder} has been cleaned')
             continue
-
-        name_pat = fr'(?<!cleaned.+){file_identifier}'
-
-        logging.debug(f'Cleaning ({file_identifier}) in: {folder}')
-        # Identify all files containing @file_identifier
-        paths = [f for f in os.listdir(folder)
-                 if regex.search(name_pat, f) is not None]
-        # Folder already cleaned or no files with @file_identifier exist
-        if len(paths)==0:
-            logging.debug(f'({file_identifier}) missing from folder: {folder}')
+        folders.append(folder)
+
+    results = _map_folders(
+        _safe_clean_folder,
+        folders,
+        workers,
+        file_identifier=file_identifier,
+        dup_subset=dup_subset,
+        file_csv_sep=file_csv_sep,
+        batch=batch,
+        batch_size=batch_size,
+        name_scheme=name_scheme,
+        compression=compression,
+        near_dup_action=near_dup_action
+    )
+
+    # merged in folder order, whatever order the workers finish in
+    for folder, result in zip(folders, results):
+        if isinstance(result, Exception):
+            logging.error(f'Failed to clean {folder}; originals kept. '
+                          f'{result!r}')
+            failed.append(result)
+            continue
+        if result is None:
             continue
 
-        # Concatenate all matched files. Reset index
-        matched = pd.concat(
-            [pd.read_csv(
-                path/folder/p,
-                sep=file_csv_sep,
-                lineterminator='\n') for p in paths]
-        ).reset_index(drop=True)
-
-        original_total += matched.shape[0]
-        logging.debug(f'Total {matched.shape[0]} tweets')
-
-        dup = matched.duplicated(subset=dup_subset)
-        dup_total += dup.sum()
-        matched.drop(matched[dup].index, axis=0, inplace=True)
-        logging.debug(f'Dropped {dup.sum()} {file_identifier} duplicates in {folder}')
-
-        name = f'{folder}-cleaned-{name_scheme if name_scheme!="" else file_identifier}'
-        u.save_csv(path/folder,
-                       matched,
-                       name,
-                       batch,
-                       batch_size,
-                       file_csv_sep)
+        originals, dups, paths = result
+        original_total += originals
+        dup_total += dups
 
         if delete_original:
             for p in paths:
@@ -160,13 +257,208 @@ def folder_dup_clean(
 
         cleaned.add(folder)
 
+    if len(failed) > 0:
+        raise RuntimeError(f'Failed to clean {len(failed)} folders') \
+            from failed[0]
+
     return original_total, dup_total
 
 
+def _safe_clean_folder(folder: Path, **kwargs):
+    """_clean_folder(), returning (rather than raising) its exception"""
+    try:
+        return _clean_folder(folder, **kwargs)
+    except Exception as e:
+        return e
+
+
+def _clean_folder(
+        folder: Path,
+        file_identifier,
+        dup_subset,
+        file_csv_sep,
+        batch,
+        batch_size,
+        name_scheme,
+        compression,
+        near_dup_action=None):
+    """
+    Deduplicate the @file_identifier files of a single @folder into its
+      cleaned file(s); the originals are left for the caller to delete. Any
+      cleaned file written before a failure is removed.
+
+    :return: tuple (original entries, duplicates removed, matched file names)
+      or None if @folder holds no matching files
+    """
+    name_pat = fr'(?<!cleaned.+){file_identifier}'
+
+    logging.debug(f'Cleaning ({file_identifier}) in: {folder}')
+    # Identify all files containing @file_identifier
+    paths = [f for f in os.listdir(folder)
+             if regex.search(name_pat, f) is not None]
+    # Folder already cleaned or no files with @file_identifier exist
+    if len(paths)==0:
+        logging.debug(f'({file_identifier}) missing from folder: {folder}')
+        return None
+
+    # Concatenate all matched files. Reset index
+    matched = pd.concat(
+        files.read_concurrently(
+            lambda p: pd.read_csv(
+                folder/p,
+                sep=file_csv_sep,
+                lineterminator='\n'),
+            paths
+        )
+    ).reset_index(drop=True)
+
+    original_total = matched.shape[0]
+    logging.debug(f'Total {matched.shape[0]} tweets')
+
+    dup = matched.duplicated(subset=dup_subset)
+    matched.drop(matched[dup].index, axis=0, inplace=True)
+    dup_total = int(dup.sum())
+    logging.debug(f'Dropped {dup_total} {file_identifier} duplicates in {folder}')
+
+    if near_dup_action and ('text_norm' in matched.columns):
+        matched, near = near_dups.mark_near_dups(matched, near_dup_action)
+        if near_dup_action == 'drop':
+            dup_total += near
+        logging.debug(f'Near-duplicates ({near_dup_action}): {near} '
+                      f'{file_identifier} in {folder}')
+    elif near_dup_action:
+        logging.warning(f'No "text_norm" in ({file_identifier}) of {folder}; '
+                        f'near-duplicates not looked for')
+
+    name = f'{folder.name}-cleaned-{name_scheme if name_scheme!="" else file_identifier}'
+    existing = set(os.listdir(folder))
+    try:
+        TwitterData(matched, name, None).save(
+            folder,
+            'csv',
+            name_scheme=name,
+            batch=batch,
+            batch_size=batch_size,
+            compression=compression
+        )
+    except Exception:
+        # don't leave a partial cleaned copy next to the originals
+        for f in set(os.listdir(folder)) - existing:
+            os.remove(folder/f)
+        raise
+
+    return original_total, dup_total, paths
+
+
 def combine_cols(tweet, cols:list) -> tuple:
+    """Row-wise packing of @cols; superseded by pack_cols()"""
     return tuple(tweet.loc[cols].values)
 
 
+def pack_cols(data: pd.DataFrame,
+              combine_map: dict = None,
+              data_type: str = 'tweets',
+              form: str = 'string',
+              drop: bool = False) -> pd.DataFrame:
+    """
+    Vectorized replacement of combine_cols(): pack each group of columns of
+      @combine_map into a single column, in one columnar operation per group
+
+    :param data: dataframe holding the columns to pack
+    :param combine_map: (optional) {packed column: [columns]}; defaults to the
+      cleaning config's '{@data_type}_combine_col_map'
+    :param data_type: one of {'tweets', 'users'}; picks the config's map
+    :param form: 'string' for the legacy '(a, b, c, d)' text, or 'struct' for
+      an Arrow struct of uint32 fields (named after the last part of each
+      column), which takes a fraction of the space and round-trips through
+      parquet
+    :param drop: whether to drop the packed columns
+    :return: copy of @data with the packed columns (@data is left as it is)
+    """
+    if combine_map is None:
+        combine_map = _combine_map(data_type)
+    if form not in {'string', 'struct'}:
+        raise ValueError(f'Invalid packing form ({form})')
+
+    # columns are only added or dropped, so the copy needn't copy any values
+    data = data.copy(deep=False)
+
+    for packed, cols in combine_map.items():
+        counts = data[cols].astype('UInt32')
+
+        if form == 'string':
+            # NA as 'nan', as row-wise packing of float columns wrote it
+            text = [counts[c].astype('string').fillna('nan') for c in cols]
+            data[packed] = '(' + text[0].str.cat(text[1:], sep=', ') + ')'
+        else:
+            import pyarrow as pa
+
+            fields = [pa.array(counts[c], type=pa.uint32()) for c in cols]
+            struct = pa.StructArray.from_arrays(fields, names=_field_names(cols))
+            data[packed] = pd.Series(struct, index=data.index,
+                                     dtype=pd.ArrowDtype(struct.type))
+
+        if drop:
+            data = data.drop(columns=cols)
+
+    return data
+
+
+def unpack_cols(data: pd.DataFrame,
+                combine_map: dict = None,
+                data_type: str = 'tweets',
+                drop: bool = True) -> pd.DataFrame:
+    """
+    Vectorized inverse of pack_cols(): restore the columns of @combine_map as
+      UInt32 columns, from either packed form
+
+    :param data: dataframe holding the packed columns
+    :param combine_map: (optional) {packed column: [columns]}; defaults to the
+      cleaning config's '{@data_type}_combine_col_map'
+    :param data_type: one of {'tweets', 'users'}; picks the config's map
+    :param drop: whether to drop the packed columns
+    :return: copy of @data with the unpacked columns (@data is left as it is)
+    """
+    if combine_map is None:
+        combine_map = _combine_map(data_type)
+
+    data = data.copy(deep=False)
+
+    for packed, cols in combine_map.items():
+        values = data[packed]
+
+        if isinstance(values.dtype, pd.ArrowDtype):
+            for c, f in zip(cols, _field_names(cols)):
+                data[c] = values.struct.field(f).astype('UInt32')
+        else:
+            # also accepts values written as numpy reprs, eg. 'np.int64(3)'
+            parts = values.astype('string') \
+                .str.replace(r'np\.\w+\(([^)]*)\)', r'\1', regex=True) \
+                .str.strip('()') \
+                .str.split(', ', n=len(cols) - 1, expand=True)
+            for i, c in enumerate(cols):
+                data[c] = pd.to_numeric(parts[i], errors='coerce') \
+                    .astype('UInt32')
+
+        if drop:
+            data = data.drop(columns=packed)
+
+    return data
+
+
+def _combine_map(data_type: str) -> dict:
+    conf = configs.read_conf('c')['twitter']['clean']
+    key = {'tweets': 'tweet_combine_col_map',
+           'users': 'users_combine_col_map'}[data_type]
+
+    return conf[key]
+
+
+def _field_names(cols: list) -> list:
+    """Struct field names of @cols, eg. 'public_metrics.like_count' -> 'like_count'"""
+    return [c.split('.')[-1] for c in cols]
+
+
 def standardize_col_name(col):
     """
     Standardize column names; primarily used in Corpes data
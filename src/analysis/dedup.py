@@ -0,0 +1,219 @@
+import json
+import os
+import logging
+import tempfile
+import regex
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from twitter_data import TwitterData, stream_save
+import configs
+
+
+logger = logging.getLogger(__name__)
+
+# columns tracking where each row came from
+_file_col = '_file'
+_row_col = '_row'
+
+
+def dedup_folders(
+        path: Path,
+        file_identifier,
+        dup_subset,
+        file_csv_sep='~',
+        delete_original=True,
+        name_scheme='',
+        buckets: int = None,
+        chunksize: int = None,
+        compression=None) -> tuple[int, int]:
+    """
+    Remove duplicate entries across every folder of @path (eg. all extraction
+      folders of a corpus), not just within each folder. Rows are streamed
+      in chunks, and only their dedup keys are hash-partitioned into on-disk
+      buckets; each bucket is deduplicated on its own, so memory use is
+      bounded by the size of a bucket rather than of the corpus.
+
+    The first occurrence of an entry is kept, in folder then file order. Each
+      folder's surviving rows are written (in their original order) to
+      '{folder}-cleaned-{name}' in that folder. Folders are recorded as
+      cleaned in '<@path>/.dedup-state.json'; on later runs their cleaned
+      files take part as already kept entries, so new folders are checked
+      against the whole corpus.
+
+    :param path: folder holding the folders to clean
+    :param file_identifier: common name pattern found in desired files
+    :param dup_subset: column name(s) by which to identify duplicates
+    :param file_csv_sep: CSV separator used
+      (default: '~')
+    :param delete_original: whether to delete the cleaned files, once every
+      folder has been written (default: True)
+    :param name_scheme: cleaned CSV file naming scheme, will default to
+      @file_identifier otherwise
+    :param buckets: (optional) number of on-disk buckets; defaults to the
+      cleaning config's dedup.buckets
+    :param chunksize: (optional) rows read at a time; defaults to the
+      cleaning config's dedup.chunksize
+    :param compression: (optional) compression of the cleaned CSVs, as in
+      TwitterData.save()
+    :return: tuple (original entries, duplicates removed)
+    """
+    conf = configs.read_conf('c')['dedup']
+    buckets = conf['buckets'] if buckets is None else buckets
+    chunksize = conf['chunksize'] if chunksize is None else chunksize
+    dup_subset = [dup_subset] if isinstance(dup_subset, str) else dup_subset
+    name = name_scheme if name_scheme != '' else file_identifier
+
+    state_path = path / '.dedup-state.json'
+    state = json.loads(state_path.read_text()) if state_path.is_file() else {}
+    done = state.get(name, {'folders': [], 'outputs': []})
+
+    # already cleaned output files go first, so their entries are kept
+    kept = [path / p for p in done['outputs'] if (path / p).is_file()]
+    new = {}
+    for folder in sorted(f for f in path.iterdir() if f.is_dir()):
+        if folder.name in done['folders']:
+            logger.debug(f'{folder} has been cleaned')
+            continue
+
+        paths = _matching_files(folder, file_identifier)
+        if len(paths) == 0:
+            logger.debug(f'({file_identifier}) missing from folder: {folder}')
+            continue
+        new[folder] = paths
+
+    if len(new) == 0:
+        return 0, 0
+
+    logger.info(f'Deduplicating ({file_identifier}) by {dup_subset} across '
+                f'{len(new)} new folders ({len(kept)} cleaned files kept)')
+
+    read = {'sep': file_csv_sep, 'lineterminator': '\n', 'dtype': str,
+            'keep_default_na': False, 'chunksize': chunksize}
+    inputs = kept + [p for paths in new.values() for p in paths]
+
+    with tempfile.TemporaryDirectory(dir=path, prefix='.dedup-') as tmp:
+        bucket_paths = _partition(inputs, dup_subset, buckets, Path(tmp), read)
+        dups = _find_duplicates(bucket_paths, dup_subset)
+
+    # rows of the cleaned files are never duplicates of one another
+    original_total, dup_total = 0, 0
+    offset = len(kept)
+    for folder, paths in new.items():
+        out_name = f'{folder.name}-cleaned-{name}'
+        counts = []
+        chunks = _surviving_chunks(
+            paths, dups, offset, read, out_name, counts
+        )
+        saved = stream_save(chunks, folder, 'csv', out_name, compression)
+        offset += len(paths)
+
+        original_total += sum(c[0] for c in counts)
+        dup_total += sum(c[1] for c in counts)
+        logger.debug(f'Dropped {sum(c[1] for c in counts)} {file_identifier} '
+                     f'duplicates in {folder}')
+
+        done['folders'].append(folder.name)
+        if saved is not None:
+            done['outputs'].append(saved.relative_to(path).as_posix())
+
+    state[name] = done
+    tmp_state = state_path.with_name(state_path.name + '.tmp')
+    tmp_state.write_text(json.dumps(state, indent=2))
+    os.replace(tmp_state, state_path)
+
+    # only once every folder has been written and recorded
+    if delete_original:
+        for paths in new.values():
+            for p in paths:
+                p.unlink()
+
+    return original_total, dup_total
+
+
+def _matching_files(folder: Path, file_identifier) -> list[Path]:
+    """Files of @folder containing @file_identifier (cleaned files excluded)"""
+    name_pat = fr'(?<!cleaned.+){file_identifier}'
+    return sorted(folder / f for f in os.listdir(folder)
+                  if regex.search(name_pat, f) is not None)
+
+
+def _partition(paths: list[Path],
+               dup_subset: list,
+               buckets: int,
+               tmp: Path,
+               read: dict) -> list[Path]:
+    """
+    Stream @paths and append the dedup key of every row, with its file number
+      and row, to the bucket chosen by the key's hash
+    :return: paths of the buckets
+    """
+    bucket_paths = [tmp / f'bucket-{b}.csv' for b in range(buckets)]
+    started = np.zeros(buckets, dtype=bool)
+
+    for file_num, p in enumerate(paths):
+        row = 0
+        with pd.read_csv(p, usecols=dup_subset, **read) as reader:
+            for chunk in reader:
+                chunk = chunk[dup_subset]
+                chunk[_file_col] = file_num
+                chunk[_row_col] = np.arange(row, row + len(chunk))
+                row += len(chunk)
+
+                hashed = pd.util.hash_pandas_object(chunk[dup_subset],
+                                                    index=False)
+                bucket = (hashed.to_numpy() % np.uint64(buckets)).astype(int)
+
+                for b, part in chunk.groupby(bucket, sort=False):
+                    part.to_csv(bucket_paths[b], index=False,
+                                mode='a' if started[b] else 'w',
+                                header=not started[b])
+                    started[b] = True
+
+    return [p for b, p in enumerate(bucket_paths) if started[b]]
+
+
+def _find_duplicates(bucket_paths: list[Path], dup_subset: list) -> dict:
+    """
+    Deduplicate each bucket, keeping the first occurrence in file and row
+      order
+    :return: {file number: sorted rows that are duplicates}
+    """
+    found = []
+    for p in bucket_paths:
+        bucket = pd.read_csv(p, dtype=str, keep_default_na=False)
+        bucket[[_file_col, _row_col]] = bucket[[_file_col, _row_col]] \
+            .astype(np.int64)
+        bucket = bucket.sort_values([_file_col, _row_col], kind='stable')
+
+        dup = bucket.duplicated(subset=dup_subset)
+        found.append(bucket.loc[dup, [_file_col, _row_col]])
+
+    if len(found) == 0:
+        # no rows to deduplicate (eg. files holding only a header)
+        return dict()
+
+    found = pd.concat(found, ignore_index=True)
+    return {f: np.sort(g[_row_col].to_numpy())
+            for f, g in found.groupby(_file_col)}
+
+
+def _surviving_chunks(paths, dups, offset, read, topic, counts):
+    """
+    Chunks of @paths without their duplicate rows, in their original order;
+      appends (rows read, rows dropped) of each chunk to @counts
+    """
+    for i, p in enumerate(paths):
+        rows = dups.get(offset + i, np.array([], dtype=np.int64))
+        start = 0
+
+        with pd.read_csv(p, **read) as reader:
+            for chunk in reader:
+                end = start + len(chunk)
+                drop = rows[(rows >= start) & (rows < end)] - start
+                keep = np.ones(len(chunk), dtype=bool)
+                keep[drop] = False
+
+                counts.append((len(chunk), len(drop)))
+                start = end
+                yield TwitterData(chunk[keep], topic, None)
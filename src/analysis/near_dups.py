@@ -0,0 +1,236 @@
+import logging
+import numpy as np
+import pandas as pd
+import configs
+
+
+logger = logging.getLogger(__name__)
+
+# multiplier of the rolling hash of a shingle's bytes
+_shingle_mult = np.uint64(0x100000001b3)
+
+
+def near_dup_clusters(texts,
+                      threshold: float = None,
+                      num_perm: int = None,
+                      shingle_size: int = None,
+                      chunksize: int = None,
+                      seed: int = None) -> np.ndarray:
+    """
+    Group near-duplicate texts (eg. copy-pasted spam, templated bot tweets)
+      without comparing every pair: each text gets a MinHash signature of its
+      character shingles, signatures are split into LSH bands, and only texts
+      sharing a band are compared (by the share of equal signature values,
+      which estimates the Jaccard similarity of their shingles). Pairs above
+      @threshold are merged into clusters with a union-find, so the cost
+      grows roughly linearly with the number of texts.
+
+    Settings left as None default to the cleaning config's near_dups.
+
+    :param texts: texts to group, eg. 'text_norm'; texts shorter than
+      @shingle_size (or NA) are never grouped
+    :param threshold: estimated Jaccard similarity above which two texts are
+      near-duplicates
+    :param num_perm: hash permutations of a signature
+    :param shingle_size: characters of a shingle
+    :param chunksize: texts hashed at a time
+    :param seed: seed of the hash permutations
+    :return: for each text, the position of the first text of its cluster
+      (its own position if it has no near-duplicate)
+    """
+    conf = configs.read_conf('c')['near_dups']
+    threshold = conf['threshold'] if threshold is None else threshold
+    num_perm = conf['num_perm'] if num_perm is None else num_perm
+    shingle_size = conf['shingle_size'] if shingle_size is None \
+        else shingle_size
+    chunksize = conf['chunksize'] if chunksize is None else chunksize
+    seed = conf['seed'] if seed is None else seed
+
+    texts = pd.Series(texts).fillna('').astype(str).str.lower() \
+        .to_numpy(dtype=object)
+    n = len(texts)
+    bands, rows = lsh_params(threshold, num_perm)
+
+    rng = np.random.default_rng(seed)
+    # odd multipliers and offsets of multiply-shift hashing
+    mult = rng.integers(1, 2**63, num_perm, dtype=np.uint64) | np.uint64(1)
+    add = rng.integers(0, 2**63, num_perm, dtype=np.uint64)
+
+    sigs = np.empty((n, num_perm), dtype=np.uint32)
+    hashed = np.zeros(n, dtype=bool)
+    for start in range(0, n, chunksize):
+        end = min(start + chunksize, n)
+        sigs[start:end], hashed[start:end] = _signatures(
+            texts[start:end], shingle_size, mult, add
+        )
+
+    pairs = _candidate_pairs(sigs, hashed, bands, rows, threshold, rng)
+    labels = _components(n, pairs)
+
+    logger.debug(f'Found {(labels != np.arange(n)).sum()} near-duplicates of '
+                 f'{n} texts ({bands} bands of {rows} rows, '
+                 f'{len(pairs)} similar pairs)')
+    return labels
+
+
+def mark_near_dups(data: pd.DataFrame,
+                   action: str = 'flag',
+                   text_col: str = 'text_norm',
+                   id_col: str = 'id',
+                   **kwargs) -> tuple[pd.DataFrame, int]:
+    """
+    Flag or drop the near-duplicates of @data (see near_dup_clusters()); the
+      first row of each cluster is kept as its original
+
+    :param data: dataframe holding @text_col
+    :param action: 'flag' to fill 'near_dup_of' with the @id_col of each
+      near-duplicate's original (NA for originals), or 'drop' to remove
+      near-duplicates. Row positions stand in for ids if @id_col is missing
+    :param text_col: column of the texts to compare
+    :param id_col: column identifying rows
+    :param kwargs: settings of near_dup_clusters()
+    :return: tuple (copy of @data flagged or without near-duplicates,
+      near-duplicates)
+    """
+    if action not in {'flag', 'drop'}:
+        raise ValueError(f'Invalid near-duplicate action ({action})')
+
+    labels = near_dup_clusters(data[text_col], **kwargs)
+    dup = labels != np.arange(len(data))
+
+    if action == 'drop':
+        return data[~dup], int(dup.sum())
+
+    # taken from the column's array, so that ids keep their dtype
+    of = data[id_col].array.take(labels) if id_col in data.columns \
+        else pd.array(labels, dtype='Int64')
+    # on a copy; the caller's frame is left as it was
+    data = data.assign(
+        near_dup_of=pd.Series(of, index=data.index).where(dup)
+    )
+
+    return data, int(dup.sum())
+
+
+def lsh_params(threshold: float,
+               num_perm: int,
+               recall: float = 0.95) -> tuple[int, int]:
+    """
+    LSH (bands, rows per band) of at most @num_perm values: the most rows per
+      band (ie. the fewest candidate pairs) with which texts exactly at
+      @threshold still share a band with probability @recall. Candidates are
+      verified against @threshold, so a lower band threshold only costs
+      comparisons
+    """
+    for rows in range(num_perm, 0, -1):
+        bands = num_perm // rows
+        if 1 - (1 - threshold ** rows) ** bands >= recall:
+            return bands, rows
+
+    return num_perm, 1
+
+
+def _signatures(texts: np.ndarray,
+                shingle_size: int,
+                mult: np.ndarray,
+                add: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    MinHash signatures of @texts, computed over all of their shingles at
+      once
+    :return: tuple (signatures, mask of the texts that have a shingle)
+    """
+    encoded = [t.encode('utf8') for t in texts]
+    lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(texts))
+    buf = np.frombuffer(b''.join(encoded), dtype=np.uint8).astype(np.uint64)
+
+    # shingles start at every byte leaving room for a whole shingle
+    counts = np.maximum(lengths - shingle_size + 1, 0)
+    hashed = counts > 0
+    text_starts = np.cumsum(lengths) - lengths
+    starts = np.repeat(text_starts, counts) \
+        + (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts,
+                                               counts))
+
+    shingles = np.zeros(len(starts), dtype=np.uint64)
+    for j in range(shingle_size):
+        shingles = shingles * _shingle_mult + buf[starts + j]
+    shingles = (shingles ^ (shingles >> np.uint64(32))) & np.uint64(2**32 - 1)
+
+    sigs = np.full((len(texts), len(mult)), np.iinfo(np.uint32).max,
+                   dtype=np.uint32)
+    if len(shingles) == 0:
+        return sigs, hashed
+
+    offsets = (np.cumsum(counts) - counts)[hashed]
+    for k in range(len(mult)):
+        values = (shingles * mult[k] + add[k]) >> np.uint64(32)
+        sigs[hashed, k] = np.minimum.reduceat(values, offsets)
+
+    return sigs, hashed
+
+
+def _candidate_pairs(sigs: np.ndarray,
+                     hashed: np.ndarray,
+                     bands: int,
+                     rows: int,
+                     threshold: float,
+                     rng: np.random.Generator) -> np.ndarray:
+    """
+    Pairs of texts sharing an LSH band whose signatures agree on at least
+      @threshold of their values
+    :return: array of (first, other) positions
+    """
+    positions = np.flatnonzero(hashed)
+    mult = rng.integers(1, 2**63, rows, dtype=np.uint64) | np.uint64(1)
+    found = []
+
+    for b in range(bands):
+        band = sigs[positions, b * rows:(b + 1) * rows].astype(np.uint64)
+        keys = (band * mult).sum(axis=1)
+
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        same = np.r_[False, sorted_keys[1:] == sorted_keys[:-1]]
+        if not same.any():
+            continue
+
+        # every text of a bucket is compared with the bucket's first text and
+        #   with the text before it, which links chains of edits that drift
+        #   away from the first
+        idx = np.arange(len(order))
+        firsts = np.maximum.accumulate(np.where(same, 0, idx))
+        other = order[same]
+        for ref in (order[firsts[same]], order[idx[same] - 1]):
+            a, b = positions[ref], positions[other]
+            similar = (sigs[a] == sigs[b]).mean(axis=1) >= threshold
+            found.append(np.column_stack([a[similar], b[similar]]))
+
+    if len(found) == 0:
+        return np.empty((0, 2), dtype=np.int64)
+
+    return np.unique(np.concatenate(found), axis=0)
+
+
+def _components(n: int, pairs: np.ndarray) -> np.ndarray:
+    """
+    Union-find over @pairs, vectorized: the roots of each pair are linked
+      (the larger to the smaller) and paths are compressed until every pair
+      shares a root
+    :return: for each of @n items, the smallest item of its component
+    """
+    labels = np.arange(n)
+    first, other = pairs[:, 0], pairs[:, 1]
+
+    while True:
+        a, b = labels[first], labels[other]
+        apart = a != b
+        if not apart.any():
+            return labels
+
+        np.minimum.at(labels, np.maximum(a, b)[apart],
+                      np.minimum(a, b)[apart])
+        while True:
+            jumped = labels[labels]
+            if (jumped == labels).all():
+                break
+            labels = jumped
@@ -0,0 +1,148 @@
+import argparse
+import json
+import tempfile
+import tracemalloc
+from logging import getLogger
+from pathlib import Path
+from time import perf_counter
+import pandas as pd
+from connection import TwitterConnection
+from checkpoint import Checkpoint
+from mock_server import MockTwitterServer
+from src.twitter_data import Tweets, Users
+import files
+import configs
+
+
+logger = getLogger(__name__)
+
+
+def bench_paginate(pages: int = 50,
+                   page_size: int = 100,
+                   latency: float = 0.05,
+                   fail_every: int = None,
+                   batch_size: int = 1000,
+                   background_save: bool = False,
+                   trace_memory: bool = True,
+                   query: tuple = ('parecer', 'parecer')) -> dict:
+    """
+    Paginate a query served by a MockTwitterServer from start to finish and
+      measure the throughput of the whole extraction path (transport,
+      parsing, buffering and saving)
+
+    :param pages: pages served for the query
+    :param page_size: tweets per page
+    :param latency: server-side latency (seconds) of every request
+    :param fail_every: (optional) inject a 429 every n-th request
+    :param batch_size: paginate's @batch_size
+    :param background_save: paginate's @background_save
+    :param trace_memory: (def: True) measure peak Python memory; slows the
+      run down somewhat
+    :param query: (name, topic) pair to paginate
+    :return: dict of measurements
+    """
+    num_batches = -(-pages * page_size // batch_size) + 1
+    data_path = files.get_project_root() / 'data'
+
+    with MockTwitterServer(pages, page_size, latency, fail_every) as mock, \
+            tempfile.TemporaryDirectory(dir=data_path) as tmp:
+        save_path = Path(tmp)
+        con = TwitterConnection('es', key='mock', host=mock.url)
+
+        if trace_memory:
+            tracemalloc.start()
+
+        start = perf_counter()
+        batches = con.paginate(
+            save_path,
+            query,
+            batch_size=batch_size,
+            num_batches=num_batches,
+            background_save=background_save
+        )
+        elapsed = perf_counter() - start
+
+        peak = None
+        if trace_memory:
+            peak = tracemalloc.get_traced_memory()[1] / 2**20
+            tracemalloc.stop()
+
+        tweets = Checkpoint.load(save_path, query).tokens
+        con.close()
+
+        served = mock.requests - mock.throttled
+
+        return {
+            'pages': served,
+            'tweets': tweets,
+            'batches': batches,
+            'throttled': mock.throttled,
+            'seconds': round(elapsed, 3),
+            'pages_per_sec': round(served / elapsed, 2),
+            'tweets_per_sec': round(tweets / elapsed, 1),
+            'peak_mib': None if peak is None else round(peak, 1),
+            'latency': {k: round(v, 4) for k, v in con.latency_stats().items()}
+        }
+
+
+def bench_parse(pages: int = 20, page_size: int = 100, repeat: int = 5) -> dict:
+    """
+    Time the parsing of synthetic pages with the schema-driven decoder
+      against pandas.json_normalize() followed by the same dtype conversion
+
+    :return: dict of seconds per page for each parser
+    """
+    with MockTwitterServer(pages, page_size, latency=0) as mock:
+        raw = [mock.page('parecer', i) for i in range(pages)]
+
+    dtypes = configs.get_yaml(
+        files.get_project_root() / 'config' / 'twitterdata.yml'
+    )['dtypes']['twitter']['regular']
+
+    def normalized(records, cls):
+        d = pd.json_normalize(records)
+        d = d.astype({c: dtypes[c] for c in d.columns
+                      if dtypes.get(c, 'object') != 'object'})
+        return cls(d, 'parecer', 'es')
+
+    timings = dict()
+    for name, parse in (('decoder', lambda r, cls: cls.from_records(r, 'parecer', 'es')),
+                        ('json_normalize', normalized)):
+        start = perf_counter()
+        for _ in range(repeat):
+            for page in raw:
+                parse(page['data'], Tweets)
+                parse(page['includes']['users'], Users)
+        timings[name] = (perf_counter() - start) / (repeat * pages)
+
+    return {
+        'sec_per_page': {k: round(v, 5) for k, v in timings.items()},
+        'speedup': round(timings['json_normalize'] / timings['decoder'], 2)
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the extraction path against a mock server')
+    parser.add_argument('--pages', type=int, default=50)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--fail-every', type=int, default=None)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--background-save', action='store_true')
+    parser.add_argument('--no-trace-memory', action='store_true')
+    args = parser.parse_args()
+
+    results = {
+        'paginate': bench_paginate(
+            args.pages,
+            args.page_size,
+            args.latency,
+            args.fail_every,
+            args.batch_size,
+            args.background_save,
+            not args.no_trace_memory
+        ),
+        'parse': bench_parse(page_size=args.page_size)
+    }
+    print(json.dumps(results, indent=2))
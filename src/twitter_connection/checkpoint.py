@@ -0,0 +1,147 @@
+import json
+import re
+from logging import getLogger
+from pathlib import Path
+from datetime import datetime
+
+
+logger = getLogger(__name__)
+
+
+class Checkpoint:
+    """
+    On-disk record of a pagination's progress, updated after every saved batch
+      so that an interrupted pagination can be resumed. Checkpoints are kept
+      in the '.checkpoints' folder of the pagination's save path, one JSON
+      file per query.
+
+    :param path: location of the checkpoint file
+    :param query: (name, topic) pair being paginated
+    :param next_token: token of the first page not entirely saved
+    :param skip: leading tweets of that page which were already saved
+    :param until_id: id below which tweets are requested; set once a first
+      page (which has no token) was cut, as it gains newer tweets over time
+    :param batches: batches saved so far
+    :param tokens: tweets saved so far
+    :param saved: paths of saved files, relative to the save path
+    :param finished: whether the query has no more pages
+    """
+    dir_name = '.checkpoints'
+
+    def __init__(self,
+                 path: Path,
+                 query: tuple,
+                 next_token: str = None,
+                 skip: int = 0,
+                 until_id: str = None,
+                 batches: int = 0,
+                 tokens: int = 0,
+                 saved: list[str] = None,
+                 finished: bool = False):
+        self.path = path
+        self.query = tuple(query)
+        self.next_token = next_token
+        self.skip = skip
+        self.until_id = until_id
+        self.batches = batches
+        self.tokens = tokens
+        self.saved = saved if saved is not None else []
+        self.finished = finished
+
+    @classmethod
+    def path_for(cls, save_path: Path, query: tuple) -> Path:
+        """Checkpoint file of @query paginated into @save_path"""
+        name = re.sub(r'[^\w\-]+', '_', query[0])
+        return save_path / cls.dir_name / f'{name}.json'
+
+    @classmethod
+    def new(cls, save_path: Path, query: tuple):
+        """Empty checkpoint; nothing is written until the first .record()"""
+        return cls(cls.path_for(save_path, query), query)
+
+    @classmethod
+    def load(cls, save_path: Path, query: tuple):
+        """
+        Read the checkpoint of @query in @save_path
+
+        :return: Checkpoint or None if no (matching) checkpoint exists
+        """
+        path = cls.path_for(save_path, query)
+        if not path.is_file():
+            return None
+
+        state = json.loads(path.read_text())
+        if tuple(state['query']) != tuple(query):
+            logger.warning(f'Checkpoint at {path} belongs to a different '
+                           f'query ({state["query"]}); ignoring it')
+            return None
+
+        return cls(
+            path,
+            state['query'],
+            state['next_token'],
+            state.get('skip', 0),
+            state.get('until_id'),
+            state['batches'],
+            state['tokens'],
+            state['saved'],
+            state['finished']
+        )
+
+    def record(self,
+               next_token: str | None,
+               tokens: int,
+               saved: list[Path],
+               skip: int = 0,
+               until_id: str = None):
+        """
+        Record a freshly saved batch and write the checkpoint to disk
+
+        :param next_token: token of the first page not entirely saved; None
+          once the query has no more pages (or for a first page, requested
+          below @until_id)
+        :param tokens: tweets in the saved batch
+        :param saved: paths of the saved batch's files
+        :param skip: leading tweets of the @next_token page already saved
+        :param until_id: id below which the remaining tweets are requested
+        """
+        save_path = self.path.parent.parent
+
+        self.next_token = next_token
+        self.skip = skip
+        self.until_id = until_id
+        self.batches += 1
+        self.tokens += tokens
+        self.saved.extend(
+            str(p.relative_to(save_path) if p.is_relative_to(save_path) else p)
+            for p in saved
+        )
+        self.finished = (next_token is None) and (until_id is None)
+
+        self.save()
+
+    def save(self):
+        """Atomically write the checkpoint to @self.path"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        state = {
+            'query': list(self.query),
+            'next_token': self.next_token,
+            'skip': self.skip,
+            'until_id': self.until_id,
+            'batches': self.batches,
+            'tokens': self.tokens,
+            'saved': self.saved,
+            'finished': self.finished,
+            'updated': datetime.now().isoformat(timespec='seconds')
+        }
+
+        # write to a temporary file first so a crash mid-write never leaves
+        #   behind a corrupt checkpoint
+        tmp = self.path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(state, indent=2))
+        tmp.replace(self.path)
+
+        logger.debug(f'Checkpoint of "{self.query[0]}": batch {self.batches}, '
+                     f'next token {self.next_token} (skip {self.skip}, '
+                     f'until id {self.until_id})')
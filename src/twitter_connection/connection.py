@@ -1,8 +1,18 @@
 import requests
+from requests.adapters import HTTPAdapter
+from collections import deque
+from contextlib import nullcontext
+from pathlib import Path
+from urllib.parse import urlsplit
 from logging import getLogger
 from decouple import config, UndefinedValueError
-from time import sleep
-from response import Response
+from time import sleep, perf_counter
+from numpy import percentile
+from response import Response, PageBuffer
+from rate_limit import RateLimiter
+from checkpoint import Checkpoint
+from journal import ResponseJournal
+from writer import BatchWriter
 import configs
 import files
 
@@ -20,12 +30,24 @@ class TwitterConnection:
     :param key: raw string of Twitter API bearer token
     :param key_name: name of .env variable that contains the desired bearer
       token
+    :param pool_size: (optional) connections kept alive in the session pool;
+      defaults to the connection config
+    :param limiter: (optional) RateLimiter pacing the requests; pass the same
+      limiter to connections sharing a bearer token
+    :param journal: (optional) ResponseJournal (or path to one) into which
+      every raw response page is appended
+    :param host: (optional) scheme and host to send requests to instead of
+      the api's (eg. a mock_server.MockTwitterServer's url)
     """
     def __init__(self,
                  lang: str,
                  is_archive: bool = False,
                  key: str = None,
-                 key_name: str = None):
+                 key_name: str = None,
+                 pool_size: int = None,
+                 limiter: RateLimiter = None,
+                 journal: ResponseJournal | Path = None,
+                 host: str = None):
 
         # TODO 2/22: move configuration logic to utils/configs.py
         #   and do all reading/writing from there
@@ -34,8 +56,49 @@ class TwitterConnection:
 
         self.lang = lang
         self.is_archive = is_archive
+        self.host = host
         self.header = self.create_headers(key, key_name)
 
+        transport = self.conf['transport']
+        self.pool_size = pool_size if pool_size is not None \
+            else transport['pool_size']
+        self.timeout = transport['timeout']
+        self.session = self._create_session(self.pool_size)
+        # seconds taken by the most recent requests
+        self.latencies = deque(maxlen=transport['latency_window'])
+
+        self.limiter = limiter if limiter is not None else RateLimiter()
+
+        if (journal is not None) and (not isinstance(journal, ResponseJournal)):
+            journal = ResponseJournal(journal)
+        self.journal = journal
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """Close the pooled connections (and the journal, if any)"""
+        self.session.close()
+        if self.journal is not None:
+            self.journal.close()
+
+    def latency_stats(self) -> dict:
+        """Summary (in seconds) of the recorded request latencies"""
+        if len(self.latencies) == 0:
+            return {'count': 0}
+
+        lat = list(self.latencies)
+        return {
+            'count': len(lat),
+            'mean': sum(lat) / len(lat),
+            'p50': percentile(lat, 50),
+            'p95': percentile(lat, 95),
+            'max': max(lat)
+        }
+
     def create_headers(self, key=None, env_key_name=None):
         """Format the bearer token as requested"""
         if env_key_name is not None:
@@ -43,19 +106,26 @@ class TwitterConnection:
 
         return {'Authorization': f'Bearer {self._auth(key, env_key_name)}'}
 
-    def create_url(self, topic, next_token=None):
+    def create_url(self, topic, next_token=None, until_id=None):
         """
-        Combine query, fields and (if available) next_token into a proper URL
+        Combine query, fields and (if available) next_token and until_id into
+          a proper URL
         """
         prefix = self.conf['paths']['query_search']\
             ['prefix_archive' if self.is_archive else 'prefix_recent']
+        if self.host is not None:
+            parts = urlsplit(prefix)
+            prefix = f'{self.host}{parts.path}?{parts.query}'
         fields = self.conf['query_fields']
+        # only tweets older than until_id
+        until = f'&until_id={until_id}' if until_id is not None else ''
 
         if (next_token is not None) and (len(next_token)>0):
             return f'{prefix}={topic}' + ' ' + \
                        f'lang:{self.lang} {fields["conditions"]}' \
                        f'&{fields["max_results"]}' \
                        f'&next_token={next_token}' \
+                       f'{until}' \
                        f'&{fields["tweet"]}' \
                        f'&{fields["expansions"]}' \
                        f'&{fields["user"]}' \
@@ -64,6 +134,7 @@ class TwitterConnection:
             return f'{prefix}={topic}' + ' ' + \
                        f'lang:{self.lang} {fields["conditions"]}' \
                        f'&{fields["max_results"]}' \
+                       f'{until}' \
                        f'&{fields["tweet"]}' \
                        f'&{fields["expansions"]}' \
                        f'&{fields["user"]}' \
@@ -74,20 +145,16 @@ class TwitterConnection:
                  query: tuple,
                  batch_size=1000,
                  num_batches=1,
-                 sleep_sec=0):
+                 sleep_sec=0,
+                 resume=False,
+                 background_save=False):
 
         # TODO 2/21: verify files are being saved properly
 
-        # TODO 2/21: at the moment the saved batches vary in size and go over
-        #   the requested amount, especially when batch_size is closer to 100
-        #   as querying for 100 tweets isn't guaranteed to (and most of the time
-        #   doesn't) return exactly 100 tweets. Current method accumulates the
-        #   response data until it is greater than @batch_size, at which point
-        #   it saves. Perhaps trim to requested @batch_size, and discard excess?
-
         """
         Make a series of .connect() calls until the desired @batch_size is reached
-          or no more results available
+          or no more results available. Batches hold exactly @batch_size tweets
+          (except possibly the last); excess tweets carry into the next batch
 
         :param save_path: location to save extracted tweets
         :param query: (name, topic) pair
@@ -95,86 +162,216 @@ class TwitterConnection:
           topic is used for the query
         :param batch_size: tweets extracted between saves
         :param num_batches: amount of batches to extract
-        :param sleep_sec: time (seconds) between consecutive queries
-        :return: int saved pages
+        :param sleep_sec: additional time (seconds) between consecutive
+          queries; requests are already paced to the rate limit by
+          @self.limiter
+        :param resume: (def: False) continue from the last checkpoint of
+          @query in @save_path, if any; @num_batches counts the batches saved
+          before the interruption
+        :param background_save: (def: False) save batches on a background
+          thread while the next pages are fetched
+        :return: int saved batches
         """
 
         logger.info(f'Starting pagination of: {query[0]}')
         logger.debug(f'Requested: {num_batches} batches of size {batch_size}'
                      f'\nPagination save path: {files.get_relative_to_proot(save_path)}')
 
-        response = self.connect(query)
-        tokens = 0
-        batches = 1
+        checkpoint = Checkpoint.load(save_path, query) if resume else None
 
-        while (response.next_token is not None) and (batches <= num_batches):
-            # break between queries if necessary
-            sleep(sleep_sec)
-
-            # if batch filled, save
-            if len(response) >= batch_size:
-                logger.debug(f'Saving batch.')
-                response.save_csv(save_path, batch=batches)
-                tokens += len(response) # update extracted token count
+        if checkpoint is None:
+            checkpoint = Checkpoint.new(save_path, query)
+        elif checkpoint.finished or (checkpoint.batches >= num_batches):
+            logger.info(f'Pagination of {query[0]} already finished; '
+                        f'{checkpoint.batches} batches saved')
+            return checkpoint.batches
+        else:
+            logger.info(f'Resuming pagination of {query[0]} from batch '
+                        f'{checkpoint.batches + 1}')
+
+        until_id = checkpoint.until_id
+        buffer = PageBuffer(self.lang, query[0], batch_size, until_id)
+        token, skip = checkpoint.next_token, checkpoint.skip
+        # batches flushed so far (not necessarily written yet)
+        batches = checkpoint.batches
+
+        with (BatchWriter() if background_save else nullcontext()) as writer:
+            while batches < num_batches:
+                response = self.connect(query, token, until_id)
+                buffer.add(response, token, skip)
+                token, skip = response.next_token, 0
+
+                # save every filled batch; the buffer keeps the excess
+                while buffer.full and (batches < num_batches):
+                    batches += 1
+                    self.save_batch(
+                        buffer, checkpoint, save_path, token, batches, writer
+                    )
+
+                if token is None:
+                    break
+
+                # break between queries if necessary
+                sleep(sleep_sec)
+
+            if (len(buffer) > 0) and (batches < num_batches):
+                # no more pages; save the partially filled batch
                 batches += 1
+                self.save_batch(
+                    buffer, checkpoint, save_path, token, batches, writer
+                )
+
+        logger.info(f'Pagination finished; retrieved {checkpoint.tokens} tokens')
+        logger.debug(f'Page buffer peaked at '
+                     f'{buffer.peak_nbytes / 2**20:.1f}MiB'
+                     f'\nRequest latencies: {self.latency_stats()}')
+        return checkpoint.batches
+
+    def save_batch(self,
+                   buffer: PageBuffer,
+                   checkpoint: Checkpoint,
+                   save_path: Path,
+                   next_token: str | None,
+                   batch_num: int,
+                   writer: BatchWriter = None):
+        """
+        Flush a batch out of @buffer, then save it and record it in
+          @checkpoint (on @writer's thread, if passed). Shared by .paginate()
+          and harvester.Harvester
 
-                # exits out of function; otherwise double saves
-                if batches > num_batches:
-                    logger.info(
-                        f'Pagination finished; retrieved {tokens} tokens')
-                    return batches
+        :param next_token: token of the page following the buffered pages
+        :param batch_num: batch number appended to the filenames
+        """
+        batch = buffer.flush()
+        resume = buffer.resume_point(next_token)
 
-                new_response = self.connect(query, response.next_token)
-                # clear previous responses to save memory
-                response = new_response
+        job = (batch, checkpoint, save_path, batch_num, *resume)
+        if writer is None:
+            self._write_batch(*job)
+        else:
+            writer.submit(self._write_batch, *job)
+
+    @staticmethod
+    def _write_batch(batch: Response,
+                     checkpoint: Checkpoint,
+                     save_path: Path,
+                     batch_num: int,
+                     resume_token: str | None,
+                     skip: int,
+                     until_id: str | None):
+        """Save @batch and record it in @checkpoint once written"""
+        saved = batch.save_csv(save_path, batch=batch_num)
+        checkpoint.record(resume_token, len(batch), saved, skip, until_id)
+
+    def journal_pages(self, query: tuple, num_pages=1, next_token=None) -> str:
+        """
+        Fetch raw pages straight into @self.journal without parsing them; the
+          tables can be rebuilt later with journal.replay_tables()
+
+        :param query: (name, topic) pair
+        :param num_pages: maximum amount of pages to fetch
+        :param next_token: (optional) token of the first page to fetch
+        :return: token of the next unfetched page (None if no more pages)
+        """
+        if self.journal is None:
+            raise ValueError('Connection has no journal to write into')
 
-            else:
-                new_response = self.connect(query, response.next_token)
-                response.append(new_response)
+        for _ in range(num_pages):
+            page = self.fetch(query, next_token)
+            next_token = page.get('meta', dict()).get('next_token')
 
-        response.save_csv(save_path, batch=batches)
-        tokens += len(response)  # update extracted token count
+            if next_token is None:
+                break
 
-        logger.info(f'Pagination finished; retrieved {tokens} tokens')
-        return batches
+        logger.info(f'Journaled {query[0]} up to token: {next_token}')
+        return next_token
 
-    def connect(self, query_topic, next_token=None) -> Response:
+    def connect(self, query_topic, next_token=None, until_id=None) -> Response:
         """
         Make a single connection and return response
 
         :param query_topic: just the TOPIC of your query -- fields and "rules" have already
           been set through .set_fields()
         :param next_token: token for next page
+        :param until_id: (optional) only request tweets older than this id
         :return: response.Response object
         """
-        url = self.create_url(query_topic[1], next_token)
-        logger.debug(f'URL: {url}')
-
         try:
-            r = self._connect_to_endpoint(url, self.header)
             response = Response(
                 lang=self.lang,
                 topic=query_topic[0],
-                response=r.json()
+                response=self.fetch(query_topic, next_token, until_id)
             )
             return response
 
-        except ConnectionError as ce:
-            if ce.args[0].status_code == 429:
-                logger.exception('Too many requests! Pausing for 5 seconds...')
-                sleep(5)
-
-                return self.connect(query_topic, next_token)
-            else:
-                logger.exception(f'{ce.args[0].status_code}\n'
-                                      f'{ce.args[0].text}')
-                raise
-
         except AttributeError as ae:
             logger.exception(f'Problem reading response attributes!'
                                   f'\n{ae.args}')
             raise
 
+    def fetch(self, query_topic, next_token=None, until_id=None) -> dict:
+        """
+        Make a single connection, retrying throttled, failed or timed out
+          requests, and return the raw JSON response (journaled if
+          @self.journal is set)
+
+        :param query_topic: (name, topic) pair
+        :param next_token: token for next page
+        :param until_id: (optional) only request tweets older than this id
+        :return: dict
+        """
+        url = self.create_url(query_topic[1], next_token, until_id)
+        logger.debug(f'URL: {url}')
+
+        attempt = 0
+        while True:
+            header, limiter = self._credentials()
+            limiter.wait()
+
+            try:
+                page = self._connect_to_endpoint(url, header, limiter).json()
+
+                if self.journal is not None:
+                    self.journal.append(self.lang, query_topic, page, next_token)
+
+                return page
+
+            except ConnectionError as ce:
+                failed = ce.args[0]
+                if (not limiter.is_retryable(failed.status_code)) \
+                        or (attempt >= limiter.max_retries):
+                    logger.exception(f'{failed.status_code}\n'
+                                     f'{failed.text}')
+                    raise
+
+                delay = self._retry_delay(limiter, failed, attempt)
+                attempt += 1
+                logger.warning(f'Request failed ({failed.status_code}); '
+                               f'retry {attempt}/{limiter.max_retries} '
+                               f'in {delay:.0f}s')
+                sleep(delay)
+
+            except requests.exceptions.RequestException as err:
+                # timed out or dropped; no response to go by, so back off
+                if attempt >= limiter.max_retries:
+                    logger.exception(f'Request failed: {err!r}')
+                    raise
+
+                delay = limiter.backoff(attempt)
+                attempt += 1
+                logger.warning(f'Request failed ({type(err).__name__}); '
+                               f'retry {attempt}/{limiter.max_retries} '
+                               f'in {delay:.0f}s')
+                sleep(delay)
+
+    def _credentials(self) -> tuple[dict, RateLimiter]:
+        """Authorization header and rate limiter to use for the next request"""
+        return self.header, self.limiter
+
+    def _retry_delay(self, limiter: RateLimiter, failed, attempt: int) -> float:
+        """Seconds to wait before retrying the @failed response"""
+        return limiter.retry_delay(failed, attempt)
+
     def _auth(self, key, env_key_name):
         """
         Verify passed API key
@@ -200,9 +397,33 @@ class TwitterConnection:
         except AssertionError as e:
             logger.exception(e.args)
 
-    def _connect_to_endpoint(self, url, headers):
+    def _create_session(self, pool_size: int) -> requests.Session:
+        """
+        Persistent session reused by every request of this connection;
+          connections are kept alive and responses gzip-encoded
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive'
+        })
+
+        return session
+
+    def _connect_to_endpoint(self, url, headers, limiter: RateLimiter = None):
         """Makes a get request and returns the response"""
-        response = requests.request('GET', url, headers=headers)
+        if limiter is None:
+            limiter = self.limiter
+
+        start = perf_counter()
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        self.latencies.append(perf_counter() - start)
+        limiter.record(response)
+
+        logger.debug(f'Request took {self.latencies[-1]:.3f}s')
 
         if response.status_code != 200:
             raise ConnectionError(response)
@@ -0,0 +1,210 @@
+import asyncio
+from logging import getLogger
+from pathlib import Path
+from connection import TwitterConnection
+from response import Response, PageBuffer
+from checkpoint import Checkpoint
+import files
+
+
+logger = getLogger(__name__)
+
+
+class Harvester:
+    """
+    Run the paginations of several queries concurrently over a single
+      TwitterConnection. Each query is paginated the same way as
+      TwitterConnection.paginate(), but the blocking .connect() calls are
+      pushed onto worker threads so that several requests can be waiting on
+      the network at once.
+
+    :param connection: TwitterConnection used for every query
+    :param max_concurrent: (optional) paginations allowed in flight at once;
+      defaults to the connection config
+    :param request_budget: (optional) total requests shared by all queries
+      of a harvest; defaults to the connection config
+    """
+    def __init__(self,
+                 connection: TwitterConnection,
+                 max_concurrent: int = None,
+                 request_budget: int = None):
+
+        conf = connection.conf['harvest']
+
+        self.connection = connection
+        self.max_concurrent = max_concurrent if max_concurrent is not None \
+            else conf['max_concurrent']
+        self.request_budget = request_budget if request_budget is not None \
+            else conf['request_budget']
+
+        self.requests_made = 0
+
+        if self.max_concurrent > connection.pool_size:
+            logger.warning(f'{self.max_concurrent} concurrent paginations '
+                           f'share a pool of {connection.pool_size} '
+                           f'connections; extra requests will open '
+                           f'unpooled connections')
+
+    @property
+    def requests_left(self):
+        return self.request_budget - self.requests_made
+
+    def run(self,
+            save_path: Path,
+            queries: list[tuple],
+            batch_size=1000,
+            num_batches=1,
+            sleep_sec=0,
+            resume=False) -> dict[str, int]:
+        """Blocking wrapper around .harvest()"""
+        return asyncio.run(self.harvest(
+            save_path, queries, batch_size, num_batches, sleep_sec, resume
+        ))
+
+    async def harvest(self,
+                      save_path: Path,
+                      queries: list[tuple],
+                      batch_size=1000,
+                      num_batches=1,
+                      sleep_sec=0,
+                      resume=False) -> dict[str, int]:
+        """
+        Paginate every query in @queries, keeping at most @self.max_concurrent
+          of them in flight. Output is saved into @save_path in the same
+          per-type layout as Response.save_csv()
+
+        :param save_path: location to save extracted tweets
+        :param queries: list of (name, topic) pairs
+        :param batch_size: tweets extracted between saves
+        :param num_batches: amount of batches to extract per query
+        :param sleep_sec: time (seconds) between consecutive queries of a
+          single pagination
+        :param resume: (def: False) continue each query from its last
+          checkpoint in @save_path, if any
+        :return: dict of {query name: saved batches}
+        """
+        logger.info(f'Starting harvest of {len(queries)} queries; '
+                    f'{self.max_concurrent} concurrent, '
+                    f'budget of {self.requests_left} requests')
+        logger.debug(f'Harvest save path: '
+                     f'{files.get_relative_to_proot(save_path)}')
+
+        self._budget_lock = asyncio.Lock()
+        slots = asyncio.Semaphore(self.max_concurrent)
+
+        async def run_query(query):
+            async with slots:
+                return await self._paginate(
+                    save_path, query, batch_size, num_batches, sleep_sec, resume
+                )
+
+        results = await asyncio.gather(
+            *(run_query(q) for q in queries),
+            return_exceptions=True
+        )
+
+        saved = dict()
+        for query, result in zip(queries, results):
+            if isinstance(result, Exception):
+                logger.error(f'Pagination of "{query[0]}" failed: '
+                             f'{result.__class__.__name__} {result.args}')
+                saved[query[0]] = 0
+            else:
+                saved[query[0]] = result
+
+        logger.info(f'Harvest finished; {self.requests_made} requests made')
+        logger.debug(f'Request latencies: {self.connection.latency_stats()}')
+        return saved
+
+    async def _paginate(self,
+                        save_path: Path,
+                        query: tuple,
+                        batch_size: int,
+                        num_batches: int,
+                        sleep_sec,
+                        resume: bool) -> int:
+        """
+        Asynchronous counterpart of TwitterConnection.paginate()
+
+        :return: int saved batches
+        """
+        logger.info(f'Starting pagination of: {query[0]}')
+
+        checkpoint = Checkpoint.load(save_path, query) if resume else None
+
+        if checkpoint is None:
+            checkpoint = Checkpoint.new(save_path, query)
+        elif checkpoint.finished or (checkpoint.batches >= num_batches):
+            logger.info(f'Pagination of "{query[0]}" already finished')
+            return checkpoint.batches
+
+        until_id = checkpoint.until_id
+        buffer = PageBuffer(self.connection.lang, query[0], batch_size,
+                            until_id)
+        token, skip = checkpoint.next_token, checkpoint.skip
+
+        while checkpoint.batches < num_batches:
+            response = await self._connect(query, token, until_id)
+            if response is None:
+                break
+
+            buffer.add(response, token, skip)
+            token, skip = response.next_token, 0
+
+            while buffer.full and (checkpoint.batches < num_batches):
+                await self._save(buffer, checkpoint, save_path, token)
+
+            if token is None:
+                break
+
+            await asyncio.sleep(sleep_sec)
+
+        if (len(buffer) > 0) and (checkpoint.batches < num_batches):
+            # out of pages (or budget); save the partially filled batch
+            await self._save(buffer, checkpoint, save_path, token)
+
+        logger.info(f'Pagination of "{query[0]}" finished; '
+                    f'retrieved {checkpoint.tokens} tokens')
+        return checkpoint.batches
+
+    async def _save(self,
+                    buffer: PageBuffer,
+                    checkpoint: Checkpoint,
+                    save_path: Path,
+                    next_token: str | None):
+        """Save a batch of @buffer on a worker thread and checkpoint it"""
+        await asyncio.to_thread(
+            self.connection.save_batch, buffer, checkpoint, save_path,
+            next_token, checkpoint.batches + 1
+        )
+
+    async def _connect(self,
+                       query: tuple,
+                       next_token=None,
+                       until_id=None) -> Response | None:
+        """
+        Take a request out of the shared budget and make it on a worker
+          thread. Returns None once the budget is exhausted
+        """
+        async with self._budget_lock:
+            if self.requests_left <= 0:
+                logger.warning(f'Request budget exhausted; stopping '
+                               f'pagination of "{query[0]}"')
+                return None
+
+            self.requests_made += 1
+
+        return await asyncio.to_thread(
+            self.connection.connect, query, next_token, until_id
+        )
+
+
+if __name__ == '__main__':
+    con = TwitterConnection('es', True, key_name='SECRET')
+    harvester = Harvester(con, max_concurrent=2, request_budget=10)
+    harvester.run(
+        files.get_project_root()/'src',
+        queries=[('test', 'test'), ('prueba', 'prueba')],
+        batch_size=500,
+        num_batches=2,
+        sleep_sec=1)
@@ -0,0 +1,150 @@
+import gzip
+import json
+import threading
+from logging import getLogger
+from pathlib import Path
+from datetime import datetime
+from typing import Iterator
+from response import Response
+
+
+logger = getLogger(__name__)
+
+
+class ResponseJournal:
+    """
+    Append-only, gzip-compressed NDJSON journal of raw query response pages.
+      Every line holds one page along with the query it answered, so that the
+      tables can later be rebuilt offline with replay() or replay_tables().
+      Safe to share between threads.
+
+    :param path: location of the journal (conventionally '*.ndjson.gz');
+      appended to if it already exists
+    """
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.pages = 0
+        self._file = gzip.open(self.path, 'at', encoding='utf8')
+        self._lock = threading.Lock()
+
+        logger.info(f'Journaling responses into: {self.path}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def append(self, lang: str, query: tuple, page: dict, next_token=None):
+        """
+        Write a single raw response page to the journal
+
+        :param lang: language of the query
+        :param query: (name, topic) pair the page answered
+        :param page: raw JSON response
+        :param next_token: token the page was requested with
+        """
+        record = {
+            'lang': lang,
+            'query': list(query),
+            'next_token': next_token,
+            'fetched_at': datetime.now().isoformat(timespec='seconds'),
+            'response': page
+        }
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+
+        with self._lock:
+            self._file.write(line)
+            # make the page recoverable even if the process dies before close
+            self._file.flush()
+            self.pages += 1
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+                logger.info(f'Closed journal {self.path.name}; '
+                            f'{self.pages} pages appended')
+
+
+def read_journal(path: Path) -> Iterator[dict]:
+    """
+    Iterate over the records of a journal. A truncated last line (eg. from
+      an interrupted fetch) is skipped
+    """
+    with gzip.open(path, 'rt', encoding='utf8') as f:
+        try:
+            for i, line in enumerate(f):
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f'Skipping malformed journal line {i} '
+                                   f'in {path}')
+        except EOFError:
+            logger.warning(f'Journal {path} ends abruptly; stopped reading')
+
+
+def replay(path: Path, topic: str = None) -> Iterator[Response]:
+    """
+    Rebuild a Response for every journaled page. Pages fetched more than once
+      (eg. re-requested by a resumed pagination) are only replayed once; a
+      page is recognized by the tweets it holds (its meta's newest and oldest
+      ids), as the same token or the first page of separate runs may hold
+      different tweets
+
+    :param path: location of the journal
+    :param topic: (optional) only replay pages of the query named @topic
+    """
+    seen = set()
+
+    for record in read_journal(path):
+        name = record['query'][0]
+        if (topic is not None) and (name != topic):
+            continue
+
+        page = _page_key(record)
+        if page is not None:
+            if page in seen:
+                continue
+            seen.add(page)
+
+        yield Response(
+            lang=record['lang'],
+            topic=name,
+            response=record['response']
+        )
+
+
+def _page_key(record: dict) -> tuple | None:
+    """
+    Key identifying the tweets of a journaled page (None for pages without
+      tweets, which are always replayed)
+    """
+    meta = record['response'].get('meta') or dict()
+    if meta.get('newest_id') is None:
+        return None
+
+    return (tuple(record['query']), record['lang'], meta['newest_id'],
+            meta.get('oldest_id'), meta.get('result_count'))
+
+
+def replay_tables(path: Path, topic: str = None) -> dict[str, Response]:
+    """
+    Rebuild the journaled pages into a single Response per query
+
+    :param path: location of the journal
+    :param topic: (optional) only replay pages of the query named @topic
+    :return: dict of {query name: Response}
+    """
+    responses = dict()
+
+    for response in replay(path, topic):
+        if response.topic in responses:
+            responses[response.topic].append(response)
+        else:
+            responses[response.topic] = response
+
+    logger.info(f'Replayed {len(responses)} queries from {Path(path).name}')
+    return responses
@@ -0,0 +1,116 @@
+import threading
+from logging import getLogger
+from connection import TwitterConnection
+from rate_limit import RateLimiter
+
+
+logger = getLogger(__name__)
+
+
+class KeyPool:
+    """
+    Bearer tokens of several .env key names, each paced by its own
+      RateLimiter. Hands out the token with the most quota left in its
+      current rate-limit window.
+
+    :param key_names: names of the .env variables holding the bearer tokens
+      (as passed to TwitterConnection's @key_name)
+    :param headers: {key name: authorization header} of every key
+    """
+    def __init__(self, key_names: list[str], headers: dict[str, dict]):
+        if len(key_names) == 0:
+            raise ValueError('Pass at least one key name')
+
+        self.key_names = list(key_names)
+        self.headers = headers
+        self.limiters = {k: RateLimiter() for k in self.key_names}
+        self._lock = threading.Lock()
+
+    def acquire(self) -> tuple[str, dict, RateLimiter]:
+        """
+        Pick the key with the most quota left; ties go to the key listed
+          first. Once every key is spent, the one resetting soonest
+
+        :return: (key name, authorization header, rate limiter)
+        """
+        with self._lock:
+            name = max(
+                self.key_names,
+                key=lambda k: (self.limiters[k].available(),
+                               -self.limiters[k].seconds_to_reset(),
+                               -self.limiters[k].requests)
+            )
+
+        return name, self.headers[name], self.limiters[name]
+
+    def has_quota(self) -> bool:
+        """Whether any key has requests left in its window"""
+        return any(lim.available() > 0 for lim in self.limiters.values())
+
+    def next_reset(self) -> float:
+        """Seconds until the first key's rate-limit window resets"""
+        return min(lim.seconds_to_reset() for lim in self.limiters.values())
+
+    def usage(self) -> dict[str, dict]:
+        """Requests made, throttles and quota left of every key"""
+        return {
+            k: {
+                'requests': lim.requests,
+                'throttled': lim.throttled,
+                'remaining': lim.remaining,
+                'limit': lim.limit,
+                'resets_in': round(lim.seconds_to_reset())
+            }
+            for k, lim in self.limiters.items()
+        }
+
+
+class PooledConnection(TwitterConnection):
+    """
+    TwitterConnection spreading its requests over several bearer tokens; every
+      page is requested with the token that has the most quota left, so the
+      throughput grows with the number of tokens held. A throttled token is
+      benched for its retry delay, and the request retried right away on
+      another token if one still has quota.
+
+    :param lang: specify language of connection
+    :param key_names: names of the .env variables holding the bearer tokens
+    :param is_archive: is this a 'Full-Archive Search'? If not, then is
+      'Recent Search'
+    :param kwargs: passed on to TwitterConnection
+    """
+    def __init__(self,
+                 lang: str,
+                 key_names: list[str],
+                 is_archive: bool = False,
+                 **kwargs):
+
+        super().__init__(lang, is_archive, key_name=key_names[0], **kwargs)
+
+        headers = {k: self.create_headers(env_key_name=k) for k in key_names}
+        self.pool = KeyPool(key_names, headers)
+
+    def close(self):
+        logger.info(f'Key usage: {self.pool.usage()}')
+        super().close()
+
+    def _credentials(self):
+        name, header, limiter = self.pool.acquire()
+        logger.debug(f'Requesting with key: {name}')
+
+        return header, limiter
+
+    def _retry_delay(self, limiter, failed, attempt):
+        delay = super()._retry_delay(limiter, failed, attempt)
+        if failed.status_code != 429:
+            return delay
+
+        # bench the throttled key for as long as it was told to wait, so it is
+        #   not picked again right away (even if the 429 reported no quota)
+        limiter.exhaust(delay)
+        if self.pool.has_quota():
+            # another key can take the request
+            return 0
+
+        # every key is spent; wait for the first one to reset
+        return self.pool.next_reset()
@@ -0,0 +1,351 @@
+import gzip
+import json
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from logging import getLogger
+from time import sleep, time
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit, parse_qs
+
+
+logger = getLogger(__name__)
+
+
+class MockTwitterServer:
+    """
+    Local stand-in for the Twitter v2 search endpoints
+      (/2/tweets/search/recent and /2/tweets/search/all). Serves synthetic
+      but realistically shaped pages -- tweets with public_metrics, geo and
+      mentions, plus includes.users, includes.places and meta.next_token --
+      with rate-limit headers, configurable latency and injected 429s. As
+      with the real api, every bearer token has its own rate-limit window,
+      tweets come newest (highest id) first and until_id requests only the
+      tweets older than an id. Pages are deterministic for a given @seed,
+      topic and page number.
+
+    :param pages: pages available per query
+    :param page_size: tweets per page
+    :param latency: seconds to wait before answering each request
+    :param fail_every: (optional) answer every n-th request with a 429
+    :param rate_limit: requests allowed per rate-limit window (per token)
+    :param window: length (seconds) of a rate-limit window
+    :param seed: seed of the synthetic data
+    :param host: interface to bind
+    :param port: port to bind; 0 picks a free one
+    """
+    paths = {'/2/tweets/search/recent', '/2/tweets/search/all'}
+
+    def __init__(self,
+                 pages: int = 50,
+                 page_size: int = 100,
+                 latency: float = 0.05,
+                 fail_every: int = None,
+                 rate_limit: int = 100000,
+                 window: int = 900,
+                 seed: int = 0,
+                 host: str = '127.0.0.1',
+                 port: int = 0):
+        self.pages = pages
+        self.page_size = page_size
+        self.latency = latency
+        self.fail_every = fail_every
+        self.rate_limit = rate_limit
+        self.window = window
+        self.seed = seed
+
+        self.requests = 0
+        self.throttled = 0
+        # connections accepted
+        self.connections = 0
+        # {authorization header: [window start, requests in window]}
+        self._windows = dict()
+        self._lock = threading.Lock()
+
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """Base URL to pass as a TwitterConnection's @host"""
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            name='mock-twitter',
+            daemon=True
+        )
+        self._thread.start()
+        logger.info(f'Mock Twitter server listening on {self.url}')
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+        logger.info(f'Mock Twitter server stopped; served {self.requests} '
+                    f'requests ({self.throttled} throttled) over '
+                    f'{self.connections} connections')
+
+    def _quota(self, token: str) -> tuple[bool, dict]:
+        """
+        Count a request against the quota of @token; returns
+          (throttled, headers)
+        """
+        with self._lock:
+            now = time()
+            window = self._windows.setdefault(token, [now, 0])
+            if now - window[0] >= self.window:
+                window[:] = [now, 0]
+
+            self.requests += 1
+            window[1] += 1
+
+            throttled = (window[1] > self.rate_limit) or (
+                (self.fail_every is not None)
+                and (self.requests % self.fail_every == 0)
+            )
+            if throttled:
+                self.throttled += 1
+
+            reset = int(window[0] + self.window)
+            remaining = max(self.rate_limit - window[1], 0)
+
+        headers = {
+            'x-rate-limit-limit': str(self.rate_limit),
+            'x-rate-limit-remaining': str(remaining),
+            # an injected 429 asks the client to come back shortly
+            'x-rate-limit-reset': str(int(now) + 1 if throttled else reset)
+        }
+        return throttled, headers
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keeps connections alive (every answer has a Content-Length), so
+            #   clients can reuse pooled connections as with the real api
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path not in server.paths:
+                    self._send(404, {'title': 'Not Found'})
+                    return
+
+                sleep(server.latency)
+                throttled, headers = server._quota(
+                    self.headers.get('Authorization', '')
+                )
+                if throttled:
+                    self._send(429, {'title': 'Too Many Requests'}, headers)
+                    return
+
+                query = parse_qs(url.query)
+                topic = query.get('query', [''])[0].split(' ')[0]
+                token = query.get('next_token', [None])[0]
+                until_id = query.get('until_id', [None])[0]
+
+                try:
+                    until_id = int(until_id) if until_id is not None else None
+                    if token is not None:
+                        page_num = int(token.lstrip('p'))
+                    elif until_id is not None:
+                        page_num = server.page_of(until_id - 1)
+                    else:
+                        page_num = 0
+                except ValueError:
+                    self._send(400, {'title': 'Invalid next_token or until_id'},
+                               headers)
+                    return
+
+                self._send(200, server.page(topic, page_num, until_id),
+                           headers)
+
+            def _send(self, status, body, headers=None):
+                data = json.dumps(body).encode('utf8')
+
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                for k, v in (headers or dict()).items():
+                    self.send_header(k, v)
+
+                if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    data = gzip.compress(data, compresslevel=1)
+                    self.send_header('Content-Encoding', 'gzip')
+
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def page_of(self, tweet_id: int) -> int:
+        """Number of the page @tweet_id belongs (or would belong) to"""
+        position = 10**18 + self.pages * self.page_size - tweet_id
+        return min(max(position // self.page_size, 0), self.pages - 1)
+
+    def page(self, topic: str, page_num: int, until_id: int = None) -> dict:
+        """
+        Synthetic response page @page_num of the query for @topic, holding
+          only the tweets older than @until_id (if passed)
+        """
+        rng = random.Random(f'{self.seed}-{topic}-{page_num}')
+        start = datetime(2023, 2, 8) - timedelta(minutes=page_num)
+
+        # some pages come back short, as with the real api
+        n = self.page_size - rng.choice([0, 0, 0, 1, 3, 7])
+
+        users = [_user(rng) for _ in range(max(n // 3, 1))]
+        places = [_place(rng) for _ in range(max(n // 10, 1))]
+
+        tweets = []
+        for i in range(n):
+            author = rng.choice(users)
+            mentioned = rng.sample(users, rng.choice([0, 0, 1, 2]))
+            tweets.append(_tweet(
+                rng,
+                topic,
+                tweet_id=10**18 + (self.pages - page_num)*self.page_size - i,
+                author=author,
+                place=rng.choice(places),
+                mentioned=mentioned,
+                created_at=start - timedelta(seconds=i)
+            ))
+
+        if until_id is not None:
+            tweets = [t for t in tweets if int(t['id']) < until_id]
+
+        page = {'meta': {'result_count': len(tweets)}}
+        if len(tweets) > 0:
+            page = {
+                'data': tweets,
+                'includes': {'users': users, 'places': places},
+                'meta': {
+                    'newest_id': tweets[0]['id'],
+                    'oldest_id': tweets[-1]['id'],
+                    'result_count': len(tweets)
+                }
+            }
+        if page_num + 1 < self.pages:
+            page['meta']['next_token'] = f'p{page_num + 1}'
+
+        return page
+
+
+_words = ('que parece creo dice tal vez quiero ojalá sé mucho hoy mañana '
+          'nunca siempre gente cosa vida casa trabajo calle ciudad noche '
+          'bien mal mejor peor eso esto aquí allá porque pero y o ni').split()
+_emoji = ['😆', '☹️', '🙏🏽', '❤️', '😂', '👩‍💻']
+_countries = [('Mexico', 'MX'), ('Spain', 'ES'), ('Argentina', 'AR'),
+              ('Colombia', 'CO'), ('Venezuela', 'VE'), ('Cuba', 'CU')]
+
+
+def _user(rng: random.Random) -> dict:
+    uid = rng.randrange(10**8, 10**18)
+    return {
+        'id': str(uid),
+        'name': f'Usuario {uid % 10000}',
+        'username': f'user_{uid % 10**6}',
+        'created_at': f'20{rng.randrange(10, 23)}-0{rng.randrange(1, 10)}-'
+                      f'1{rng.randrange(0, 10)}T10:00:00.000Z',
+        'location': rng.choice(_countries)[0],
+        'public_metrics': {
+            'followers_count': rng.randrange(0, 50000),
+            'following_count': rng.randrange(0, 5000),
+            'tweet_count': rng.randrange(0, 100000),
+            'listed_count': rng.randrange(0, 100)
+        }
+    }
+
+
+def _place(rng: random.Random) -> dict:
+    country, code = rng.choice(_countries)
+    pid = f'{rng.getrandbits(64):016x}'
+    return {
+        'id': pid,
+        'full_name': f'Ciudad {pid[:4]}, {country}',
+        'country': country,
+        'country_code': code
+    }
+
+
+def _tweet(rng: random.Random,
+           topic: str,
+           tweet_id: int,
+           author: dict,
+           place: dict,
+           mentioned: list[dict],
+           created_at: datetime) -> dict:
+    words = rng.choices(_words, k=rng.randrange(5, 40))
+    words.insert(rng.randrange(len(words)), topic)
+    if rng.random() < 0.2:
+        words.append(rng.choice(_emoji))
+
+    prefix = ''.join(f'@{m["username"]} ' for m in mentioned)
+    text = prefix + ' '.join(words)
+
+    tweet = {
+        'id': str(tweet_id),
+        'edit_history_tweet_ids': [str(tweet_id)],
+        'text': text,
+        'author_id': author['id'],
+        'created_at': created_at.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+        'lang': 'es',
+        'geo': {'place_id': place['id']},
+        'public_metrics': {
+            'retweet_count': rng.randrange(0, 20),
+            'reply_count': rng.randrange(0, 20),
+            'like_count': rng.randrange(0, 200),
+            'quote_count': rng.randrange(0, 5),
+            'impression_count': rng.randrange(0, 5000)
+        }
+    }
+    if rng.random() < 0.1:
+        tweet['geo']['coordinates'] = {
+            'type': 'Point',
+            'coordinates': [rng.uniform(-120, 0), rng.uniform(-50, 40)]
+        }
+    if len(mentioned) > 0:
+        start = 0
+        mentions = []
+        for m in mentioned:
+            end = start + len(m['username']) + 1
+            mentions.append({'start': start, 'end': end,
+                             'username': m['username'], 'id': m['id']})
+            start = end + 1
+        tweet['entities'] = {'mentions': mentions}
+    if rng.random() < 0.05:
+        tweet['referenced_tweets'] = [
+            {'type': 'replied_to', 'id': str(tweet_id - rng.randrange(1, 10**6))}
+        ]
+
+    return tweet
+
+
+if __name__ == '__main__':
+    with MockTwitterServer(pages=3, latency=0) as mock:
+        print(f'Serving on {mock.url}; Ctrl-C to stop')
+        try:
+            mock._thread.join()
+        except KeyboardInterrupt:
+            pass
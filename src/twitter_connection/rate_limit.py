@@ -0,0 +1,172 @@
+import threading
+from logging import getLogger
+from time import sleep, time
+import configs
+
+
+logger = getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Paces requests of a single bearer token using the rate-limit headers
+      returned by the Twitter API, and decides how long to wait before
+      retrying a failed request. Safe to share between threads.
+
+    :param reserve: (optional) requests kept in reserve; once the remaining
+      quota drops to this amount, wait out the rest of the window
+    :param max_retries: (optional) retries of a 429 or 5xx response
+    :param backoff_base: (optional) seconds waited before the first retry;
+      doubled on every consecutive retry
+    :param backoff_max: (optional) upper bound (seconds) of a single backoff;
+      a 429 carrying a reset header waits for the reset however long it is
+    """
+    limit_header = 'x-rate-limit-limit'
+    remaining_header = 'x-rate-limit-remaining'
+    reset_header = 'x-rate-limit-reset'
+
+    def __init__(self,
+                 reserve: int = None,
+                 max_retries: int = None,
+                 backoff_base: float = None,
+                 backoff_max: float = None):
+
+        conf = configs.read_conf('conn')['rate_limit']
+
+        self.reserve = reserve if reserve is not None else conf['reserve']
+        self.max_retries = max_retries if max_retries is not None \
+            else conf['max_retries']
+        self.backoff_base = backoff_base if backoff_base is not None \
+            else conf['backoff_base']
+        self.backoff_max = backoff_max if backoff_max is not None \
+            else conf['backoff_max']
+
+        # quota of the current window, as last reported by the API
+        self.limit = None
+        self.remaining = None
+        self.reset = None # epoch seconds
+
+        # responses seen, and how many of those were 429s
+        self.requests = 0
+        self.throttled = 0
+
+        # earliest time at which the next request may be sent
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, response):
+        """Count a response of this token and record its quota headers"""
+        with self._lock:
+            self.requests += 1
+            if response.status_code == 429:
+                self.throttled += 1
+
+        self.update(response.headers)
+
+    def update(self, headers):
+        """Record the quota reported in a response's @headers"""
+        try:
+            limit = headers.get(self.limit_header)
+            remaining = headers.get(self.remaining_header)
+            reset = headers.get(self.reset_header)
+        except AttributeError:
+            return
+
+        with self._lock:
+            if limit is not None:
+                self.limit = int(limit)
+            if remaining is not None:
+                self.remaining = int(remaining)
+            if reset is not None:
+                self.reset = int(reset)
+
+        logger.debug(f'Rate limit: {self.remaining}/{self.limit} remaining, '
+                     f'resets in {self.seconds_to_reset():.0f}s')
+
+    def exhaust(self, seconds: float):
+        """
+        Treat the quota as spent for the next @seconds, eg. after a 429 that
+          did not say when the window resets
+        """
+        with self._lock:
+            self.remaining = 0
+            self.reset = max(self.reset or 0, time() + seconds)
+
+    def available(self) -> float:
+        """
+        Requests left in the current window; unknown quotas (eg. a token not
+          used yet) count as unlimited
+        """
+        if self.seconds_to_reset() <= 0:
+            # window has reset (or was never reported)
+            return self.limit if self.limit is not None else float('inf')
+        if self.remaining is None:
+            return float('inf') if self.limit is None else 0
+
+        return max(self.remaining - self.reserve, 0)
+
+    def seconds_to_reset(self) -> float:
+        """Seconds until the current rate-limit window resets"""
+        if self.reset is None:
+            return 0.0
+
+        return max(self.reset - time(), 0.0)
+
+    def wait(self):
+        """
+        Block until the next request may be sent. The remaining quota is
+          spread evenly over what is left of the window, so requests go out at
+          the highest rate the quota allows
+        """
+        with self._lock:
+            now = time()
+            window = self.seconds_to_reset()
+
+            if (self.remaining is None) or (window <= 0):
+                # nothing known about the current window
+                pace = 0.0
+            elif self.remaining <= self.reserve:
+                # quota used up; wait for the window to reset (plus a second
+                #   as the reset header is rounded down)
+                pace = 0.0
+                self._next_slot = max(self._next_slot, now + window + 1)
+                self.remaining = None
+            else:
+                pace = window / (self.remaining - self.reserve)
+                self.remaining -= 1
+
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + pace
+
+        delay = slot - now
+        if delay > 0:
+            logger.debug(f'Pacing request; waiting {delay:.2f}s')
+            sleep(delay)
+
+    def is_retryable(self, status_code: int) -> bool:
+        """Whether a response with @status_code is worth retrying"""
+        return (status_code == 429) or (500 <= status_code < 600)
+
+    def retry_delay(self, response, attempt: int) -> float:
+        """
+        Seconds to wait before retrying @response
+
+        :param response: failed requests.Response
+        :param attempt: number of retries already made
+        """
+        if response.status_code == 429:
+            self.update(response.headers)
+            if response.headers.get(self.reset_header) is not None:
+                # the api tells when the window resets; retrying sooner is
+                #   bound to fail (plus a second, as the header is rounded down)
+                return self.seconds_to_reset() + 1
+
+        # nothing to go by; back off exponentially
+        return self.backoff(attempt)
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Seconds to wait before a retry, doubling with every @attempt already
+          made (up to @self.backoff_max)
+        """
+        return min(self.backoff_base * 2**attempt, self.backoff_max)
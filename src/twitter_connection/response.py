@@ -1,6 +1,7 @@
 import json
 from logging import getLogger
 from pathlib import Path
+import pandas as pd
 from src.twitter_data import TwitterData, Tweets, Users, Places
 
 
@@ -13,14 +14,16 @@ class Response:
 
     :param lang:
     :param topic:
-    :param response:
+    :param response: (optional) raw JSON response; leave empty to fill
+      @self.tables directly
     """
-    def __init__(self, lang, topic, response):
+    def __init__(self, lang, topic, response=None):
         self.lang = lang
         self.topic = topic
         # dict of various data extracted from query
         self.tables = dict()
-        self.extract_data(response)
+        if response is not None:
+            self.extract_data(response)
 
     @property
     def next_token(self):
@@ -53,13 +56,13 @@ class Response:
             if t_type=='meta':
                 self.tables[t_type] = table
             elif t_type=='data':
-                data = Tweets.from_json(table, self.topic, self.lang)
+                data = Tweets.from_records(table, self.topic, self.lang)
                 self.tables['data'] = data
             elif t_type=='users':
-                data = Users.from_json(table, self.topic, self.lang)
+                data = Users.from_records(table, self.topic, self.lang)
                 self.tables[t_type] = data
             elif t_type=='places':
-                data = Places.from_json(table, self.topic, self.lang)
+                data = Places.from_records(table, self.topic, self.lang)
                 self.tables[t_type] = data
             elif isinstance(table, list):
                 # table is a list of values
@@ -100,22 +103,175 @@ class Response:
 
             table[1].reset_index(drop=True, inplace=True)
 
-    def save_csv(self, path: Path, batch=None):
-        """Save extracted data as CSV"""
+    def save_csv(self, path: Path, batch=None) -> list[Path]:
+        """
+        Save extracted data as CSV, each table into its type directory
+
+        :param path: location to save
+        :param batch: (optional) batch number to append to filenames
+        :return: paths of saved data
+        """
         try:
+            save_paths = []
             for t_type, data in self.tables.items():
                 # TODO 2/22: see if metadata should be saved instead
                 if t_type=='meta':
                     continue
 
                 if isinstance(data, TwitterData):
-                    data.save_csv(path, batch_num=batch, sep_by_type=True)
+                    save_paths.extend(
+                        data.save(path, 'csv', batch_num=batch, sep_by_type=True)
+                    )
+
+            return save_paths
 
         except Exception as e:
             logger.exception(e.args)
             raise
 
 
+class PageBuffer:
+    """
+    Accumulates response pages of a single query and cuts them into batches
+      of exactly @batch_size tweets. Page tables are only collected; they are
+      concatenated once per flushed batch instead of on every page. Tweets
+      over @batch_size are carried into the next batch (along with the
+      users and places of their page), so the buffer never holds more than
+      @batch_size tweets plus a single page.
+
+    :param lang: language of the query
+    :param topic: name of the query
+    :param batch_size: tweets per flushed batch
+    :param until_id: (optional) id below which the pages' tweets were
+      requested (see Checkpoint)
+    """
+    def __init__(self, lang, topic, batch_size: int, until_id: str = None):
+        self.lang = lang
+        self.topic = topic
+        self.batch_size = batch_size
+        self.until_id = until_id
+
+        # {table type: [page DataFrames]}
+        self.pages = dict()
+        self.meta = None
+        self.tweets = 0
+
+        # memory (bytes) held by the buffered pages
+        self.nbytes = 0
+        self.peak_nbytes = 0
+
+        # request token and size of the last page; the carried tweets are
+        #   always the tail of this page
+        self._last_token = None
+        self._last_len = 0
+        # id of the last flushed tweet
+        self._last_id = None
+
+    def __len__(self):
+        return self.tweets
+
+    @property
+    def full(self):
+        return self.tweets >= self.batch_size
+
+    def add(self, response: Response, token: str = None, skip: int = 0):
+        """
+        Buffer the tables of a single page
+
+        :param response: page to buffer
+        :param token: token the page was requested with
+        :param skip: leading tweets of the page to drop (already saved)
+        """
+        self._last_token = token
+        self._last_len = 0
+        self.meta = response.tables.get('meta', self.meta)
+
+        for t_type, table in response.tables.items():
+            if not isinstance(table, TwitterData):
+                continue
+
+            d = table.d
+            if t_type == 'data':
+                self._last_len = d.shape[0]
+                if skip > 0:
+                    d = d.iloc[skip:]
+                self.tweets += d.shape[0]
+
+            self.pages.setdefault(t_type, []).append(d)
+            self.nbytes += int(d.memory_usage(deep=True).sum())
+
+        self.peak_nbytes = max(self.peak_nbytes, self.nbytes)
+
+    def flush(self) -> Response:
+        """
+        Concatenate the buffered pages into a Response of at most
+          @self.batch_size tweets and keep the rest for the next batch
+        """
+        tables = dict()
+        carry = dict()
+
+        for t_type, frames in self.pages.items():
+            table = pd.concat(frames, axis=0, ignore_index=True)
+
+            if t_type == 'data':
+                carry[t_type] = [table.iloc[self.batch_size:]]
+                table = table.iloc[:self.batch_size]
+                if table.shape[0] > 0:
+                    self._last_id = table['id'].iloc[-1]
+            elif (self.tweets > self.batch_size) and (len(frames) > 0):
+                # carried tweets may reference includes of the last page
+                carry[t_type] = [frames[-1]]
+
+            if 'id' in table.columns:
+                table = table.drop_duplicates(subset='id', ignore_index=True)
+
+            tables[t_type] = table
+
+        batch = Response(self.lang, self.topic)
+        for t_type, table in tables.items():
+            batch.tables[t_type] = _table_types.get(t_type, TwitterData)(
+                table, self.topic, self.lang
+            )
+        if self.meta is not None:
+            batch.tables['meta'] = self.meta
+
+        logger.debug(f'Flushed batch of {len(batch)} tweets; buffer peaked '
+                     f'at {self.peak_nbytes / 2**20:.1f}MiB')
+
+        self.pages = {t: [f.reset_index(drop=True) for f in frames]
+                      for t, frames in carry.items()}
+        self.tweets = sum(f.shape[0] for f in self.pages.get('data', []))
+        self.nbytes = sum(int(f.memory_usage(deep=True).sum())
+                          for frames in self.pages.values() for f in frames)
+
+        return batch
+
+    def resume_point(self, next_token) -> tuple:
+        """
+        Where to pick up the query after the batches flushed so far
+
+        :param next_token: token of the page following the last buffered page
+        :return: (token of page to request, leading tweets of it to skip,
+          id below which tweets are requested)
+        """
+        if self.tweets == 0:
+            if next_token is None:
+                # the query has no more pages
+                return None, 0, None
+            return next_token, 0, self.until_id
+
+        if self._last_token is None:
+            # a first page has no token and gains newer tweets over time, so
+            #   the rest of it is requested as the tweets older (pages are
+            #   newest first) than the last flushed one
+            return None, 0, str(self._last_id)
+
+        return self._last_token, self._last_len - self.tweets, self.until_id
+
+
+_table_types = {'data': Tweets, 'users': Users, 'places': Places}
+
+
 def save_json(path, data):
     with open(path, 'w') as f:
         try:
@@ -0,0 +1,90 @@
+import queue
+import threading
+from logging import getLogger
+import configs
+
+
+logger = getLogger(__name__)
+
+
+class BatchWriter:
+    """
+    Runs save jobs on a background thread so that the next pages can be
+      fetched while finished batches are written to disk. Jobs are run in
+      the order they were submitted. Once a job fails, the remaining jobs are
+      dropped and the error is raised in the submitting thread by the next
+      .submit() or by .close().
+
+    :param max_pending: (optional) jobs allowed to wait in the queue before
+      .submit() blocks; defaults to the connection config
+    """
+    def __init__(self, max_pending: int = None):
+        if max_pending is None:
+            max_pending = configs.read_conf('conn')['writer']['max_pending']
+
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._closed = False
+
+        self._thread = threading.Thread(
+            target=self._run,
+            name='batch-writer',
+            daemon=True
+        )
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+            return
+
+        # don't mask the exception raised in the with-block
+        try:
+            self.close()
+        except Exception as e:
+            logger.exception(f'Batch writer also failed: {e.args}')
+
+    def submit(self, job, *args):
+        """
+        Queue @job(*args) to be run on the writer thread; blocks while the
+          queue is full
+        """
+        if self._closed:
+            raise RuntimeError('Batch writer is closed')
+
+        self._raise_error()
+        self._queue.put((job, args))
+
+    def close(self):
+        """Wait for every queued job to finish and stop the writer thread"""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+
+        self._raise_error()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError('Background save failed') from error
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            if self._error is not None:
+                # a previous job failed; skip the rest
+                continue
+
+            job, args = item
+            try:
+                job(*args)
+            except Exception as e:
+                logger.exception(f'Background save failed: {e.args}')
+                self._error = e
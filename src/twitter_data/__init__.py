@@ -1 +1,5 @@
 from src.twitter_data.tweets import Tweets
+from src.twitter_data.users import Users
+from src.twitter_data.places import Places
+from src.twitter_data.dataset import Dataset
+from twitter_data import TwitterData
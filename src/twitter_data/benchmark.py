@@ -0,0 +1,229 @@
+import argparse
+import json
+import tempfile
+from logging import getLogger
+from pathlib import Path
+from time import perf_counter
+import numpy as np
+import pandas as pd
+import twitter_data
+from twitter_data import TwitterData
+import files
+import configs
+
+
+logger = getLogger(__name__)
+
+_words = ('que parece creo dice tal vez quiero ojalá sé mucho hoy mañana '
+          'nunca siempre gente cosa vida casa trabajo calle ciudad noche '
+          'bien mal mejor peor eso esto aquí allá porque pero y o ni').split()
+_verbs = ['parecer', 'creer', 'decir', 'querer', 'pensar', 'esperar']
+
+
+def synthetic_tweets(rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Cleaned-looking tweets table of @rows rows, typed as in the twitterdata
+      config
+    """
+    rng = np.random.default_rng(seed)
+    words = np.array(_words, dtype=object)
+
+    lengths = rng.integers(5, 40, rows)
+    text = [' '.join(words[rng.integers(0, len(words), n)]) for n in lengths]
+    created = pd.Timestamp('2021-01-01') \
+        + pd.to_timedelta(np.sort(rng.integers(0, 2 * 365 * 86400, rows)),
+                          unit='s')
+
+    data = pd.DataFrame({
+        'tweet_id': 10**18 + np.arange(rows, dtype=np.uint64),
+        'verbs': rng.choice(_verbs, rows),
+        'text_orig': text,
+        'text_norm': text,
+        'retweet_reply_like_quote': [
+            f'({a}, {b}, {c}, {d})'
+            for a, b, c, d in rng.integers(0, 200, (rows, 4))
+        ],
+        'created_at': created,
+        'user_id': rng.integers(10**8, 10**18, rows, dtype=np.uint64),
+        'lang': rng.choice(['es', 'pt'], rows, p=[0.9, 0.1]),
+    })
+
+    dtypes = configs.get_yaml(
+        files.get_project_root() / 'config' / 'twitterdata.yml'
+    )['dtypes']['twitter']['regular']
+    return data.astype({c: t for c, t in dtypes.items()
+                        if c in data.columns and t != 'object'})
+
+
+def _timed(fn, repeat: int) -> float:
+    """Best wall time (seconds) of @repeat calls of @fn"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = perf_counter()
+        fn()
+        best = min(best, perf_counter() - start)
+
+    return best
+
+
+def bench_storage(rows: int = 200000, repeat: int = 3) -> dict:
+    """
+    Compare file size and load time of the CSV (plain and gzip compressed)
+      and parquet backends of TwitterData on a synthetic tweets table. Its
+      texts are drawn from a few dozen words, which favours gzip's
+      cross-row matching; real tweets compress less evenly
+
+    :param rows: rows of the synthetic table
+    :param repeat: loads timed per measurement (best is kept)
+    :return: dict of measurements
+    """
+    data = TwitterData(synthetic_tweets(rows), 'parecer', 'es')
+    analysis_cols = configs.read_conf('p')['analysis_cols']
+    data_path = files.get_project_root() / 'data'
+
+    with tempfile.TemporaryDirectory(dir=data_path) as tmp:
+        csv_path = data.save(Path(tmp), 'csv', name_scheme='bench',
+                             compression=False)[0]
+        gz_path = data.save(Path(tmp), 'csv', name_scheme='bench',
+                            compression='gzip')[0]
+        pq_path = data.save(Path(tmp), 'parquet', name_scheme='bench')[0]
+
+        results = {
+            'rows': rows,
+            'csv_mib': round(csv_path.stat().st_size / 2**20, 2),
+            'csv_gzip_mib': round(gz_path.stat().st_size / 2**20, 2),
+            'parquet_mib': round(pq_path.stat().st_size / 2**20, 2),
+            'load_sec': {
+                'csv': _timed(lambda: TwitterData.from_csv(
+                    csv_path, 'es', topic='parecer'), repeat),
+                'parquet': _timed(lambda: TwitterData.from_parquet(
+                    pq_path, 'es', topic='parecer'), repeat),
+                'parquet_analysis_cols': _timed(lambda: TwitterData.from_parquet(
+                    pq_path, 'es', topic='parecer', columns=analysis_cols),
+                    repeat),
+                'parquet_filtered': _timed(lambda: TwitterData.from_parquet(
+                    pq_path, 'es', topic='parecer',
+                    filters=[('created_at', '>=', pd.Timestamp('2022-10-01'))]),
+                    repeat),
+            }
+        }
+
+    results['load_sec'] = {k: round(v, 4) for k, v in results['load_sec'].items()}
+    results['load_speedup'] = round(
+        results['load_sec']['csv'] / results['load_sec']['parquet'], 1)
+    results['size_ratio'] = round(results['csv_mib'] / results['parquet_mib'], 1)
+    results['gzip_size_ratio'] = round(
+        results['csv_gzip_mib'] / results['parquet_mib'], 2)
+
+    return results
+
+
+def _legacy_parse_dates(data: pd.DataFrame, dates: list) -> pd.DataFrame:
+    """Date handling of from_csv before format sniffing, for comparison"""
+    date_formats = twitter_data.conf['date_formats']
+
+    try:
+        data[dates] = data[dates].apply(
+            pd.to_datetime, format=date_formats['cleaned'], utc=True)
+    except ValueError:
+        data[dates] = data[dates].apply(
+            pd.to_datetime, format=date_formats['extracted'], utc=True)
+    for d in dates:
+        data[d] = data[d].dt.tz_localize(None)
+
+    return data
+
+
+def bench_dates(rows: int = 200000, repeat: int = 3) -> dict:
+    """
+    Compare the date parsing of from_csv before and after format sniffing,
+      on dates written in the 'cleaned' and the 'extracted' format
+
+    :param rows: rows of the synthetic table
+    :param repeat: parses timed per measurement (best is kept)
+    :return: dict of measurements
+    """
+    date_formats = twitter_data.conf['date_formats']
+    created = synthetic_tweets(rows)['created_at']
+    results = {'rows': rows}
+
+    for name in ('cleaned', 'extracted'):
+        strings = pd.DataFrame({
+            'created_at': created.dt.strftime(date_formats[name])
+        })
+        legacy = _timed(
+            lambda: _legacy_parse_dates(strings.copy(), ['created_at']), repeat)
+        sniffed = _timed(
+            lambda: twitter_data._parse_dates(strings.copy(), ['created_at']),
+            repeat)
+
+        assert _legacy_parse_dates(strings.copy(), ['created_at']).equals(
+            twitter_data._parse_dates(strings.copy(), ['created_at']))
+
+        results[name] = {'legacy_sec': round(legacy, 4),
+                         'sniffed_sec': round(sniffed, 4),
+                         'speedup': round(legacy / sniffed, 1)}
+
+    return results
+
+
+def synthetic_texts(rows: int, seed: int = 0) -> pd.Series:
+    """
+    Tweet texts of @rows rows with mentions, accents, emoji, tabs and
+      newlines, and a share of repeated (retweeted) texts
+    """
+    rng = np.random.default_rng(seed)
+    extras = np.array(['@usuario_1', '@Ñandú', 'ñoño', 'árbol', 'você',
+                       '😀', '👍🏽', '🇦🇷', '❤️', '\t', '\n\n', '你好'],
+                      dtype=object)
+    words = np.concatenate([np.array(_words, dtype=object), extras])
+
+    lengths = rng.integers(5, 40, rows)
+    text = np.array([' '.join(words[rng.integers(0, len(words), n)])
+                     for n in lengths], dtype=object)
+    # about a quarter of the texts repeat an earlier one
+    repeated = rng.random(rows) < 0.25
+    text[repeated] = text[rng.integers(0, rows, repeated.sum())]
+
+    return pd.Series(text, dtype='string')
+
+
+def bench_normalize(rows: int = 200000, repeat: int = 3) -> dict:
+    """
+    Compare Tweets.normalize before (norm_text and unidecode applied row by
+      row) and after batching
+
+    :param rows: rows of the synthetic texts
+    :param repeat: normalizations timed per measurement (best is kept)
+    :return: dict of measurements
+    """
+    from unidecode import unidecode
+    from tweets import Tweets, normalize_texts
+
+    texts = synthetic_texts(rows)
+    legacy = _timed(
+        lambda: texts.apply(Tweets.norm_text).apply(unidecode), repeat)
+    batched = _timed(lambda: normalize_texts(texts), repeat)
+
+    assert texts.apply(Tweets.norm_text).apply(unidecode).astype('string') \
+        .equals(normalize_texts(texts))
+
+    return {'rows': rows,
+            'legacy_rows_per_sec': round(rows / legacy),
+            'batched_rows_per_sec': round(rows / batched),
+            'speedup': round(legacy / batched, 1)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the TwitterData storage backends')
+    parser.add_argument('bench', nargs='?', default='storage',
+                        choices=['storage', 'dates', 'normalize'])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    bench = {'storage': bench_storage,
+             'dates': bench_dates,
+             'normalize': bench_normalize}[args.bench]
+    print(json.dumps(bench(args.rows, args.repeat), indent=2))
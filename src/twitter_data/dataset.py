@@ -0,0 +1,306 @@
+import json
+import threading
+from logging import getLogger
+from pathlib import Path
+from datetime import datetime
+import pandas as pd
+from twitter_data import TwitterData
+from tweets import Tweets
+from users import Users
+from places import Places
+import files
+import configs
+
+
+logger = getLogger(__name__)
+gconf = configs.read_conf()
+
+_types = {'tweets': Tweets, 'users': Users, 'places': Places,
+          'twitterdata': TwitterData}
+# candidate id columns of each data type, in order of preference
+_id_cols = {'tweets': ['id', 'tweet_id'],
+            'users': ['id', 'user_id'],
+            'places': ['id', 'place_id'],
+            'twitterdata': ['id', 'tweet_id']}
+
+
+class Dataset:
+    """
+    Partitioned store of extracted, cleaned and processed data. Files are laid
+      out as
+
+        <root>/<stage>/<corpus>/lang=<lang>/verb=<verb>/date=<date>/<file>
+
+      and every written file is recorded in '<root>/manifest.jsonl' with its
+      row count, id range, 'created_at' range and schema. Queries are answered
+      from the manifest, so only the files that can match are opened.
+
+    :param root: (optional) location of the dataset; defaults to the general
+      config's file_paths.dataset
+    """
+    manifest_name = 'manifest.jsonl'
+    stages = {'extracted', 'cleaned', 'processed'}
+
+    def __init__(self, root: Path = None):
+        if root is None:
+            root = files.get_project_root() / gconf['file_paths']['dataset']
+
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.root / self.manifest_name
+
+        self._manifest = None
+        self._lock = threading.Lock()
+
+    @property
+    def manifest(self) -> pd.DataFrame:
+        """Every file recorded in the dataset, one row per file"""
+        if self._manifest is None:
+            if self.manifest_path.is_file():
+                with open(self.manifest_path, 'r', encoding='utf8') as f:
+                    records = [json.loads(line) for line in f if line.strip()]
+            else:
+                records = []
+
+            self._manifest = pd.DataFrame.from_records(
+                records, columns=_manifest_columns
+            )
+            # kept as the recorded ints/strings; a file without ids would
+            #   otherwise make them floats, which can't hold tweet ids exactly
+            for col in ('id_min', 'id_max'):
+                self._manifest[col] = pd.Series(
+                    [r.get(col) for r in records], dtype=object,
+                    index=self._manifest.index
+                )
+
+        return self._manifest
+
+    def partition(self,
+                  stage: str,
+                  corpus: str,
+                  lang: str,
+                  verb: str,
+                  date: str) -> Path:
+        """Directory of a single partition"""
+        if stage not in self.stages:
+            raise ValueError(f'@stage "{stage}" is not one of ({self.stages})')
+
+        return self.root / stage / corpus / f'lang={lang}' \
+            / f'verb={verb}' / f'date={date}'
+
+    def write(self,
+              data: TwitterData,
+              stage: str,
+              corpus: str = 'twitter',
+              verb: str = None,
+              date: str = None,
+              save_format: str = 'parquet') -> Path:
+        """
+        Save @data into its partition and record it in the manifest
+
+        :param data: data to save
+        :param stage: one of {'extracted', 'cleaned', 'processed'}
+        :param corpus: one of {'twitter', 'corpes'}
+        :param verb: (optional) verb of interest; defaults to @data.topic
+        :param date: (optional) partition date; defaults to today
+        :param save_format: one of {"csv", "parquet"}
+        :return: path of the saved file
+        """
+        if verb is None:
+            verb = data.topic
+        if date is None:
+            date = files.get_str_datetime_now(True, False)
+
+        path = self.partition(stage, corpus, data.lang, verb, date)
+        path.mkdir(parents=True, exist_ok=True)
+
+        data_type = type(data).__name__.lower()
+        part = sum(1 for f in path.iterdir() if f.name.startswith(data_type))
+
+        saved = data.save(
+            path,
+            save_format,
+            name_scheme=f'{data_type}-part-{part}',
+            batch_num=None
+        )[0]
+
+        record = {
+            'path': saved.relative_to(self.root).as_posix(),
+            'stage': stage,
+            'corpus': corpus,
+            'lang': data.lang,
+            'verb': verb,
+            'date': date,
+            'data_type': data_type,
+            'format': save_format,
+            'rows': int(data.shape[0]),
+            **_id_range(data.d, data_type),
+            **_date_range(data.d),
+            'schema': {c: str(t) for c, t in data.d.dtypes.items()},
+            'written': datetime.now().isoformat(timespec='seconds')
+        }
+
+        with self._lock:
+            with open(self.manifest_path, 'a', encoding='utf8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._manifest = None
+
+        logger.info(f'Wrote {record["rows"]} {data_type} into partition: '
+                    f'{path.relative_to(self.root)}')
+        return saved
+
+    def query(self,
+              stage: str = None,
+              corpus: str = None,
+              lang: str = None,
+              verb: str | list = None,
+              data_type: str = None,
+              dates: tuple = None,
+              created: tuple = None,
+              ids: list = None) -> pd.DataFrame:
+        """
+        Manifest entries of the files that can hold matching rows; every
+          argument left as None matches everything
+
+        :param stage: one of {'extracted', 'cleaned', 'processed'}
+        :param corpus: one of {'twitter', 'corpes'}
+        :param lang: language
+        :param verb: verb (or list of verbs) of interest
+        :param data_type: one of {'tweets', 'users', 'places', 'twitterdata'}
+        :param dates: (start, end) partition dates, inclusive (ISO strings)
+        :param created: (start, end) 'created_at' timestamps, inclusive
+        :param ids: ids that must fall within the file's id range
+        :return: DataFrame of manifest entries
+        """
+        m = self.manifest
+        keep = pd.Series(True, index=m.index)
+
+        for col, value in (('stage', stage), ('corpus', corpus),
+                           ('lang', lang), ('data_type', data_type)):
+            if value is not None:
+                keep &= m[col] == value
+
+        if verb is not None:
+            keep &= m['verb'].isin([verb] if isinstance(verb, str) else verb)
+
+        if dates is not None:
+            keep &= (m['date'] >= str(dates[0])) & (m['date'] <= str(dates[1]))
+
+        if created is not None:
+            start = pd.Timestamp(created[0]).isoformat()
+            end = pd.Timestamp(created[1]).isoformat()
+            # files without date statistics can't be ruled out
+            keep &= m['created_min'].isna() | (
+                (m['created_max'] >= start) & (m['created_min'] <= end)
+            )
+
+        if ids is not None:
+            keep &= m.apply(lambda r: _ids_in_range(r, ids), axis=1) \
+                if len(m) > 0 else keep
+
+        matched = m[keep]
+        logger.debug(f'Manifest query matched {len(matched)}/{len(m)} files')
+        return matched
+
+    def read(self, columns: list = None, filters: list = None, **query):
+        """
+        Load and concatenate the files matching @query (see .query()); the
+          result takes the type of the matched data
+
+        :param columns: (optional) columns to read
+        :param filters: (optional) row filters, applied while reading parquet
+          files and in memory otherwise
+        :param query: arguments of .query()
+        :return: TwitterData (or subclass) or None if nothing matched
+        """
+        matched = self.query(**query)
+        if len(matched) == 0:
+            return None
+
+        types = matched['data_type'].unique()
+        if len(types) > 1:
+            raise ValueError(f'Query matched several data types ({types}); '
+                             f'pass @data_type')
+        cls = _types[types[0]]
+
+        frames = []
+        for _, entry in matched.iterrows():
+            path = self.root / entry['path']
+            if entry['format'] == 'parquet':
+                d = cls.from_parquet(path, entry['lang'], entry['verb'],
+                                     columns=columns, filters=filters).d
+            else:
+                d = cls.from_csv(path, entry['lang'], entry['verb'],
+                                 subset=columns).d
+                d = _apply_filters(d, filters)
+            frames.append(d)
+
+        topic = matched['verb'].iloc[0] if matched['verb'].nunique() == 1 \
+            else 'combined'
+        lang = matched['lang'].iloc[0]
+
+        return cls(pd.concat(frames, ignore_index=True), topic, lang)
+
+
+_manifest_columns = ['path', 'stage', 'corpus', 'lang', 'verb', 'date',
+                     'data_type', 'format', 'rows', 'id_col', 'id_min',
+                     'id_max', 'created_min', 'created_max', 'schema',
+                     'written']
+
+
+def _id_range(data: pd.DataFrame, data_type: str) -> dict:
+    """Id column of @data and its min/max (ints kept as ints)"""
+    for col in _id_cols[data_type]:
+        if (col in data.columns) and (data[col].notna().any()):
+            lo, hi = data[col].min(), data[col].max()
+            if pd.api.types.is_integer_dtype(data[col]):
+                lo, hi = int(lo), int(hi)
+            else:
+                lo, hi = str(lo), str(hi)
+
+            return {'id_col': col, 'id_min': lo, 'id_max': hi}
+
+    return {'id_col': None, 'id_min': None, 'id_max': None}
+
+
+def _date_range(data: pd.DataFrame) -> dict:
+    """Min/max 'created_at' of @data as ISO strings (if parsed as dates)"""
+    if ('created_at' in data.columns) \
+            and pd.api.types.is_datetime64_any_dtype(data['created_at']) \
+            and data['created_at'].notna().any():
+        return {'created_min': data['created_at'].min().isoformat(),
+                'created_max': data['created_at'].max().isoformat()}
+
+    return {'created_min': None, 'created_max': None}
+
+
+def _ids_in_range(entry: pd.Series, ids: list) -> bool:
+    """Whether any of @ids falls within the id range of manifest @entry"""
+    lo, hi = entry['id_min'], entry['id_max']
+    if lo is None:
+        return True
+
+    if isinstance(lo, int):
+        return any(lo <= int(i) <= hi for i in ids)
+
+    return any(lo <= str(i) <= hi for i in ids)
+
+
+def _apply_filters(data: pd.DataFrame, filters: list | None) -> pd.DataFrame:
+    """Apply pyarrow-style (column, op, value) @filters to @data in memory"""
+    if filters is None:
+        return data
+
+    ops = {'==': '__eq__', '!=': '__ne__', '<': '__lt__', '<=': '__le__',
+           '>': '__gt__', '>=': '__ge__'}
+    keep = pd.Series(True, index=data.index)
+
+    for col, op, value in filters:
+        if op == 'in':
+            keep &= data[col].isin(value)
+        elif op == 'not in':
+            keep &= ~data[col].isin(value)
+        else:
+            keep &= getattr(data[col], ops[op])(value).fillna(False)
+
+    return data[keep].reset_index(drop=True)
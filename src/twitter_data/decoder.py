@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+from logging import getLogger
+import files
+import configs
+
+
+logger = getLogger(__name__)
+conf = configs.get_yaml(files.get_project_root() / 'config' / 'twitterdata.yml')
+
+
+class Decoder:
+    """
+    Build typed DataFrames straight from Twitter v2 JSON objects using the
+      fields declared in the 'schemas' of the twitterdata config and the
+      dtypes declared in its 'dtypes'. Nested fields (public_metrics, geo,
+      entities) are read by their '.'-joined paths -- the same column names
+      pandas.json_normalize() produces -- without normalizing every object.
+      A dtype given in the schema takes precedence over the config's
+      'dtypes'.
+
+    :param data_type: one of {'tweets', 'users', 'places'}
+    :param rename: (def: False) rename columns as in the extraction config's
+      'rename_maps'
+    """
+    def __init__(self, data_type: str, rename: bool = False):
+        if data_type not in conf['schemas']:
+            raise ValueError(f'No schema for data type ({data_type})')
+
+        self.data_type = data_type
+        self.renames = configs.read_conf('e')['rename_maps'][data_type] \
+            if rename else dict()
+
+        # fields grouped by their top-level key, so each nested object is
+        #   looked up once per record: {key: [(field, path below key, dtype)]}
+        self.fields = dict()
+        dtypes = conf['dtypes']['twitter']['regular']
+        for f, dtype in conf['schemas'][data_type].items():
+            key, *path = f.split('.')
+            if dtype is None:
+                dtype = dtypes.get(self.renames.get(f, f))
+
+            self.fields.setdefault(key, []).append((f, tuple(path), dtype))
+
+    def decode(self, records: list[dict]) -> pd.DataFrame:
+        """
+        Decode a list of JSON objects into a DataFrame. Fields missing from
+          every object are left out, as pandas.json_normalize() would
+        """
+        columns = dict()
+
+        for key, fields in self.fields.items():
+            objs = [r.get(key) for r in records]
+            if all(o is None for o in objs):
+                continue
+
+            for name, path, dtype in fields:
+                if len(path) == 0:
+                    values = objs
+                elif len(path) == 1:
+                    values = [o.get(path[0]) if isinstance(o, dict) else None
+                              for o in objs]
+                else:
+                    values = [_get_path(o, path) for o in objs]
+
+                if all(v is None for v in values):
+                    continue
+
+                name = self.renames.get(name, name)
+                columns[name] = _typed_column(values, dtype)
+
+        return pd.DataFrame(columns, index=pd.RangeIndex(len(records)))
+
+
+def _get_path(record: dict, path: tuple):
+    """Value at nested @path of @record (None if any level is missing)"""
+    for key in path:
+        try:
+            record = record[key]
+        except (KeyError, TypeError):
+            return None
+
+    return record
+
+
+def _typed_column(values: list, dtype: str | None):
+    """Convert @values into an array of the configured @dtype"""
+    if dtype is None or dtype == 'object':
+        # left as a list so that nested lists/dicts stay single objects
+        return values
+
+    if dtype in {'string', 'category'}:
+        return pd.array(values, dtype=dtype)
+
+    if dtype.lower().startswith(('int', 'uint')):
+        # twitter returns ids as strings; convert all at once through numpy
+        mask = np.fromiter((v is None for v in values), bool, len(values))
+        if mask.any():
+            values = ['0' if m else v for v, m in zip(values, mask)]
+
+        data = np.array(values, dtype=np.dtype(dtype.lower()))
+        if dtype[0].isupper():
+            # nullable pandas dtype
+            return pd.arrays.IntegerArray(data, mask)
+
+        return data
+
+    return pd.array(values, dtype=dtype)
+
+
+_decoders = dict()
+
+
+def decode(records: list[dict], data_type: str) -> pd.DataFrame:
+    """Decode @records with a (cached) Decoder of @data_type"""
+    if data_type not in _decoders:
+        _decoders[data_type] = Decoder(data_type)
+
+    return _decoders[data_type].decode(records)
@@ -0,0 +1,214 @@
+import os
+import shutil
+from logging import getLogger
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import files
+import configs
+
+
+logger = getLogger(__name__)
+gconf = configs.read_conf()
+
+
+class IdStore:
+    """
+    Set of uint64 ids kept on disk as sorted .npy segments: one base segment
+      plus append-only delta segments holding the ids added since the last
+      compaction. Segments are memory-mapped, and membership is tested with a
+      vectorized binary search over each of them, so lookups cost neither the
+      memory nor the parsing time of the whole set.
+
+    :param path: directory of the store; created if missing
+    :param max_deltas: (optional) delta segments kept before they are merged
+      into the base; defaults to the general config's id_store.max_deltas
+    """
+    base_name = 'base.npy'
+
+    def __init__(self, path: Path, max_deltas: int = None):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_deltas = max_deltas if max_deltas is not None \
+            else gconf['id_store']['max_deltas']
+
+    def __len__(self):
+        return sum(len(s) for s in self._segments())
+
+    def __contains__(self, item):
+        return bool(self.contains(np.array([item], dtype=np.uint64))[0])
+
+    @classmethod
+    def is_store(cls, path: Path) -> bool:
+        """Whether @path is (or will be created as) an IdStore directory"""
+        return path.is_dir() or (path.suffix == '')
+
+    @classmethod
+    def from_text(cls, text_path: Path, path: Path, **kwargs):
+        """
+        Create a store at @path holding the ids of a legacy id file, separated
+          by whitespace (TwitterData._write_ids) or commas
+          (cleaning.update_ids)
+        """
+        text = text_path.read_text().replace(',', ' ')
+        ids = np.array(text.split(), dtype=np.uint64)
+        store = cls(path, **kwargs)
+        store.add(ids)
+        store.compact()
+
+        logger.info(f'Imported {len(store)} ids from {text_path.name}')
+        return store
+
+    def copy(self, path: Path):
+        """Copy of this store at @path (replacing any store there)"""
+        path = Path(path)
+        if path.exists():
+            shutil.rmtree(path)
+        shutil.copytree(self.path, path)
+
+        return type(self)(path, self.max_deltas)
+
+    def contains(self, ids) -> np.ndarray:
+        """
+        Boolean mask of which @ids are in the store
+
+        :param ids: array-like of uint64 ids
+        """
+        ids = np.asarray(ids, dtype=np.uint64)
+        found = np.zeros(len(ids), dtype=bool)
+
+        for seg in self._segments():
+            found |= in_sorted(seg, ids)
+
+        return found
+
+    def to_array(self) -> np.ndarray:
+        """Every id of the store, sorted"""
+        segments = list(self._segments())
+        if len(segments) == 0:
+            return np.array([], dtype=np.uint64)
+
+        return np.sort(np.concatenate(segments))
+
+    def add(self, ids) -> np.ndarray:
+        """
+        Add @ids to the store as a new delta segment
+
+        :param ids: array-like of uint64 ids
+        :return: the sorted ids that were not already in the store
+        """
+        ids = np.unique(np.asarray(ids, dtype=np.uint64))
+        new = ids[~self.contains(ids)]
+
+        if len(new) > 0:
+            deltas = self._delta_paths()
+            num = int(deltas[-1].stem.split('-')[1]) + 1 if deltas else 0
+            _save_atomic(self.path / f'delta-{num:06d}.npy', new)
+
+            if len(deltas) + 1 > self.max_deltas:
+                self.compact()
+
+        logger.debug(f'Added {len(new)} of {len(ids)} ids to {self.path.name}')
+        return new
+
+    def compact(self):
+        """Merge every delta segment into the base segment"""
+        deltas = self._delta_paths()
+        if len(deltas) == 0:
+            return
+
+        segments = [np.load(p, mmap_mode='r') for p in self._paths()]
+        # segments are disjoint, so sorting their union is enough
+        merged = np.sort(np.concatenate(segments), kind='stable')
+        del segments
+
+        _save_atomic(self.path / self.base_name, merged)
+        for p in deltas:
+            p.unlink()
+
+        logger.debug(f'Compacted {len(deltas)} delta segments of '
+                     f'{self.path.name} ({len(merged)} ids)')
+
+    def _delta_paths(self) -> list[Path]:
+        return sorted(self.path.glob('delta-*.npy'))
+
+    def _paths(self) -> list[Path]:
+        base = self.path / self.base_name
+        return ([base] if base.is_file() else []) + self._delta_paths()
+
+    def _segments(self):
+        for p in self._paths():
+            yield np.load(p, mmap_mode='r')
+
+
+def default_store_path(data_type: str) -> Path:
+    """
+    IdStore of @data_type in the general config's file_paths.twitter_ids;
+      a legacy '{data type}.csv' or '.txt' id file there is imported on first
+      use
+    """
+    id_path = files.get_project_root() \
+        / gconf['file_paths']['twitter_ids'] \
+        / data_type
+
+    if not id_path.exists():
+        for legacy in (id_path.with_suffix('.csv'), id_path.with_suffix('.txt')):
+            if legacy.is_file():
+                IdStore.from_text(legacy, id_path)
+                break
+
+    return id_path
+
+
+def default_text_path(data_type: str) -> Path:
+    """
+    Legacy ' '-separated id file of @data_type in the general config's
+      file_paths.twitter_ids; used for types whose ids are not integers
+      (eg. places, whose ids are hexadecimal strings)
+    """
+    return files.get_project_root() \
+        / gconf['file_paths']['twitter_ids'] \
+        / (data_type + '.csv')
+
+
+def integer_ids(ids: pd.Series) -> bool:
+    """Whether @ids are integers (or text of digits), ie. fit an IdStore"""
+    if pd.api.types.is_integer_dtype(ids):
+        return True
+
+    return bool(ids.dropna().astype(str).str.fullmatch(r'\d+').all())
+
+
+def in_sorted(sorted_ids: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    """Boolean mask of which @ids are in the sorted array @sorted_ids"""
+    if len(sorted_ids) == 0:
+        return np.zeros(len(ids), dtype=bool)
+
+    idx = np.searchsorted(sorted_ids, ids)
+    idx[idx == len(sorted_ids)] = 0
+    return sorted_ids[idx] == ids
+
+
+def id_array(ids: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+    """
+    uint64 ids of @ids and the mask of the rows holding one (ie. not NA);
+      ids stored as text (eg. read with an object dtype) are converted
+    """
+    valid = ids.notna().to_numpy()
+    values = ids[valid]
+    if pd.api.types.is_integer_dtype(values):
+        return values.to_numpy(dtype=np.uint64), valid
+
+    if not integer_ids(values):
+        raise ValueError(f'Ids are not integers (eg. {values.iloc[0]!r}); '
+                         f'only uint64 ids can be stored or indexed')
+
+    return np.array(values.astype(str).tolist(), dtype=np.uint64), valid
+
+
+def _save_atomic(path: Path, array: np.ndarray):
+    """Write @array to @path so that readers never see a partial file"""
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp, path)
@@ -0,0 +1,253 @@
+import json
+from logging import getLogger
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from twitter_data import TwitterData, apply_dtypes, arrow_struct_types
+from id_store import id_array, in_sorted, _save_atomic
+import files
+import configs
+
+
+logger = getLogger(__name__)
+gconf = configs.read_conf()
+
+# one entry per id: where its record was saved
+_entry = np.dtype([('id', np.uint64), ('file', np.uint32), ('row', np.uint64)])
+
+
+class ProvenanceIndex:
+    """
+    Maps ids to the file (and row within it) holding their record. Laid out
+      like an IdStore: entries sorted by id in a memory-mapped base segment
+      plus append-only delta segments, merged once there are too many; file
+      paths are kept once, in 'files.json'. Only the first location of an id
+      is kept, ie. the file it was first saved to.
+
+    :param path: directory of the index; created if missing
+    :param max_deltas: (optional) delta segments kept before they are merged
+      into the base; defaults to the general config's id_store.max_deltas
+    """
+    base_name = 'base.npy'
+    files_name = 'files.json'
+
+    def __init__(self, path: Path, max_deltas: int = None):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_deltas = max_deltas if max_deltas is not None \
+            else gconf['id_store']['max_deltas']
+
+        files_path = self.path / self.files_name
+        self.files = json.loads(files_path.read_text()) \
+            if files_path.is_file() else []
+
+    def __len__(self):
+        return sum(len(s) for s in self._segments())
+
+    def add(self, ids, source_path: Path, rows=None) -> int:
+        """
+        Record that @ids are held in @source_path
+
+        :param ids: array-like of uint64 ids
+        :param source_path: file holding the records of @ids
+        :param rows: (optional) row of each id within @source_path (header
+          excluded); defaults to the position of each id in @ids
+        :return: number of ids that were not already indexed
+        """
+        ids = np.asarray(ids, dtype=np.uint64)
+        rows = np.arange(len(ids), dtype=np.uint64) if rows is None \
+            else np.asarray(rows, dtype=np.uint64)
+
+        # keep the first row of repeated ids, and only ids not yet indexed
+        ids, first = np.unique(ids, return_index=True)
+        rows = rows[first]
+        new = ~self._contains(ids)
+        if not new.any():
+            return 0
+
+        entries = np.empty(new.sum(), dtype=_entry)
+        entries['id'] = ids[new]
+        entries['file'] = self._file_num(source_path)
+        entries['row'] = rows[new]
+
+        deltas = self._delta_paths()
+        num = int(deltas[-1].stem.split('-')[1]) + 1 if deltas else 0
+        _save_atomic(self.path / f'delta-{num:06d}.npy', entries)
+
+        if len(deltas) + 1 > self.max_deltas:
+            self.compact()
+
+        logger.debug(f'Indexed {len(entries)} ids of {Path(source_path).name}')
+        return len(entries)
+
+    def add_file(self, path: Path, id_col: str = 'id') -> int:
+        """
+        Index every id of an already saved CSV or parquet file
+
+        :param path: saved file
+        :param id_col: column holding the ids; ids that are not integers
+          (eg. of places) raise a ValueError
+        :return: number of ids that were not already indexed
+        """
+        if path.suffix == '.parquet':
+            ids = pd.read_parquet(path, columns=[id_col])[id_col]
+        else:
+            # read as text, so that id_array() rejects non-integer ids
+            #   explicitly
+            ids = pd.read_csv(path, sep=gconf['csv_sep'], usecols=[id_col],
+                              dtype={id_col: str})[id_col]
+
+        values, valid = id_array(ids)
+        return self.add(values, path, np.flatnonzero(valid))
+
+    def locate(self, ids) -> pd.DataFrame:
+        """
+        Where the records of @ids are; ids not indexed are left out
+
+        :param ids: array-like of uint64 ids
+        :return: DataFrame of ('id', 'path', 'row'), sorted by path and row
+        """
+        ids = np.unique(np.asarray(ids, dtype=np.uint64))
+        found = []
+
+        for seg in self._segments():
+            hit = in_sorted(seg['id'], ids)
+            idx = np.searchsorted(seg['id'], ids[hit])
+            found.append(np.asarray(seg[idx]))
+
+        entries = np.concatenate(found) if found else np.empty(0, _entry)
+        located = pd.DataFrame({
+            'id': entries['id'],
+            'path': [self._resolve(f) for f in entries['file']],
+            'row': entries['row'].astype(np.int64)
+        })
+
+        return located.sort_values(['path', 'row'], ignore_index=True)
+
+    def fetch(self,
+              ids,
+              lang: str,
+              topic: str = None,
+              cls=TwitterData,
+              columns: list = None):
+        """
+        Load the records of @ids, reading only the files that hold them: the
+          row groups holding them in parquet files, and CSVs only up to their
+          last wanted row
+
+        :param ids: array-like of uint64 ids
+        :param lang: language of the data
+        :param topic: (optional) name to give the data; defaults to 'fetched'
+        :param cls: TwitterData (sub)class to return
+        :param columns: (optional) columns to read
+        :return: @cls of the records found (in file and row order)
+        """
+        located = self.locate(ids)
+        topic = 'fetched' if topic is None else topic
+        frames = []
+
+        for path, group in located.groupby('path', sort=False):
+            rows = group['row'].to_numpy()
+            if path.suffix == '.parquet':
+                frames.append(_parquet_rows(path, rows, columns))
+            else:
+                frames.append(_csv_rows(path, rows, lang, topic, cls, columns))
+
+        logger.info(f'Fetched {len(located)} records from '
+                    f'{located["path"].nunique()} files')
+
+        data = pd.concat(frames, ignore_index=True) if frames \
+            else pd.DataFrame(columns=columns)
+        return cls(data, topic, lang)
+
+    def compact(self):
+        """Merge every delta segment into the base segment"""
+        deltas = self._delta_paths()
+        if len(deltas) == 0:
+            return
+
+        merged = np.concatenate([np.load(p) for p in self._paths()])
+        # segments are disjoint, so sorting their union by id is enough
+        merged = merged[np.argsort(merged['id'], kind='stable')]
+
+        _save_atomic(self.path / self.base_name, merged)
+        for p in deltas:
+            p.unlink()
+
+    def _contains(self, ids: np.ndarray) -> np.ndarray:
+        found = np.zeros(len(ids), dtype=bool)
+        for seg in self._segments():
+            found |= in_sorted(seg['id'], ids)
+
+        return found
+
+    def _file_num(self, path: Path) -> int:
+        """Number of @path in self.files, adding it if new"""
+        path = Path(path).absolute()
+        try:
+            name = path.relative_to(files.get_project_root()).as_posix()
+        except ValueError:
+            name = path.as_posix()
+
+        if name not in self.files:
+            self.files.append(name)
+            tmp = self.path / (self.files_name + '.tmp')
+            tmp.write_text(json.dumps(self.files, ensure_ascii=False))
+            tmp.replace(self.path / self.files_name)
+
+        return self.files.index(name)
+
+    def _resolve(self, num: int) -> Path:
+        path = Path(self.files[num])
+        return path if path.is_absolute() else files.get_project_root() / path
+
+    def _delta_paths(self) -> list[Path]:
+        return sorted(self.path.glob('delta-*.npy'))
+
+    def _paths(self) -> list[Path]:
+        base = self.path / self.base_name
+        return ([base] if base.is_file() else []) + self._delta_paths()
+
+    def _segments(self):
+        for p in self._paths():
+            yield np.load(p, mmap_mode='r')
+
+
+def _parquet_rows(path: Path, rows: np.ndarray, columns: list = None):
+    """@rows of a parquet file, reading only the row groups holding them"""
+    import pyarrow.parquet as pq
+
+    pf = pq.ParquetFile(path)
+    sizes = [pf.metadata.row_group(i).num_rows
+             for i in range(pf.metadata.num_row_groups)]
+    starts = np.cumsum([0] + sizes)
+
+    groups = np.unique(np.searchsorted(starts, rows, side='right') - 1)
+    table = pf.read_row_groups(groups.tolist(), columns=columns)
+
+    # position of each wanted row within the row groups read
+    offsets = np.cumsum([0] + [sizes[g] for g in groups])
+    group_of = np.searchsorted(starts, rows, side='right') - 1
+    local = offsets[np.searchsorted(groups, group_of)] + rows - starts[group_of]
+
+    return apply_dtypes(
+        table.take(local).to_pandas(types_mapper=arrow_struct_types)
+    )
+
+
+def _csv_rows(path, rows, lang, topic, cls, columns=None):
+    """@rows of a CSV, streamed in chunks up to the last wanted row"""
+    last = rows.max()
+    taken = []
+    start = 0
+
+    for chunk in cls.iter_csv(path, lang, topic, subset=columns):
+        end = start + chunk.shape[0]
+        inside = rows[(rows >= start) & (rows < end)]
+        taken.append(chunk.d.iloc[inside - start])
+
+        start = end
+        if start > last:
+            break
+
+    return pd.concat(taken, ignore_index=True)
@@ -0,0 +1,218 @@
+import sqlite3
+import time
+from hashlib import blake2b
+from logging import getLogger
+from pathlib import Path
+import files
+import configs
+
+
+logger = getLogger(__name__)
+gconf = configs.read_conf()
+
+# keys bound per statement; below SQLite's smallest default variable limit
+_batch = 500
+# seconds before a hit refreshes when an entry was last used
+_touch_after = 3600
+
+
+class TextCache:
+    """
+    Persistent cache of normalized texts, kept in a SQLite database. Entries
+      are addressed by a hash of the original text and of the normalizer
+      version, so entries of an older normalizer are never returned and just
+      age out. Once the entries exceed @max_bytes, the least recently used
+      (to within an hour) are evicted.
+
+    :param path: (optional) database file; created if missing, defaults to
+      the general config's file_paths.text_cache
+    :param version: version of the normalizer whose output is cached
+    :param max_bytes: (optional) size of the entries (keys and texts) above
+      which entries are evicted; defaults to the general config's
+      text_cache.max_mb
+    """
+    def __init__(self,
+                 path: Path = None,
+                 version: int = 1,
+                 max_bytes: int = None):
+        conf = gconf['text_cache']
+        if path is None:
+            path = files.get_project_root() / gconf['file_paths']['text_cache']
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.version = version
+        self.max_bytes = max_bytes if max_bytes is not None \
+            else int(conf['max_mb'] * 2**20)
+        # evict down to this size, so eviction isn't run on every write
+        self.low_bytes = int(self.max_bytes * conf['evict_to'])
+
+        # hits and misses of this instance (.stats() adds the lifetime ones)
+        self.hits = 0
+        self.misses = 0
+
+        self._conn = sqlite3.connect(self.path, timeout=60)
+        self._create()
+
+    def __len__(self):
+        return self._conn.execute('SELECT count(*) FROM entries').fetchone()[0]
+
+    def keys(self, texts: list) -> list[bytes]:
+        """Addresses of the normalized @texts"""
+        prefix = f'{self.version}\0'
+        return [blake2b((prefix + t).encode('utf8'), digest_size=16).digest()
+                for t in texts]
+
+    def get_many(self, texts: list, keys: list = None) -> list:
+        """
+        Cached normalized @texts, in bulk; marks the entries found as used
+
+        :param texts: original texts
+        :param keys: (optional) .keys() of @texts, if already computed
+        :return: normalized text of each of @texts, None where missing
+        """
+        keys = self.keys(texts) if keys is None else keys
+        found = {}
+        now = time.time()
+
+        with self._conn:
+            for i in range(0, len(keys), _batch):
+                batch = keys[i:i + _batch]
+                marks = ','.join('?' * len(batch))
+                found.update(self._conn.execute(
+                    f'SELECT key, value FROM entries WHERE key IN ({marks})',
+                    batch
+                ))
+                # recency is only kept to within _touch_after, so that warm
+                #   lookups seldom write
+                self._conn.execute(
+                    f'UPDATE entries SET used = ? '
+                    f'WHERE used < ? AND key IN ({marks})',
+                    [now, now - _touch_after, *batch]
+                )
+
+            hits = len(found)
+            self._count(hits, len(keys) - hits)
+
+        return [found.get(k) for k in keys]
+
+    def put_many(self, texts: list, normed: list, keys: list = None):
+        """
+        Cache the normalized texts @normed of @texts, then evict the least
+          recently used entries if the cache has grown past self.max_bytes
+
+        :param texts: original texts
+        :param normed: normalized text of each of @texts
+        :param keys: (optional) .keys() of @texts, if already computed
+        """
+        keys = self.keys(texts) if keys is None else keys
+        now = time.time()
+        # in key order, so rows are appended to the table's b-tree in order
+        rows = sorted((k, v, len(k) + len(v.encode('utf8')), now)
+                      for k, v in zip(keys, normed))
+
+        with self._conn:
+            # only the rows actually inserted count towards the size; texts
+            #   already cached (eg. by another process) are ignored
+            added = 0
+            for row in rows:
+                added += row[2] * self._conn.execute(
+                    'INSERT OR IGNORE INTO entries (key, value, size, used) '
+                    'VALUES (?, ?, ?, ?)',
+                    row
+                ).rowcount
+            if added > 0:
+                self._add_meta('bytes', added)
+
+        if self._meta('bytes') > self.max_bytes:
+            self.evict(self.low_bytes)
+
+    def evict(self, max_bytes: int) -> int:
+        """
+        Delete the least recently used entries until the entries take at most
+          @max_bytes
+        :return: number of entries deleted
+        """
+        with self._conn:
+            size = self._conn.execute(
+                'SELECT total(size) FROM entries').fetchone()[0]
+            excess = int(size) - max_bytes
+
+            deleted = 0
+            if excess > 0:
+                # oldest entries first, until the bytes freed before each one
+                #   cover the excess
+                deleted = self._conn.execute(
+                    'DELETE FROM entries WHERE key IN ('
+                    '  SELECT key FROM ('
+                    '    SELECT key, sum(size) OVER (ORDER BY used, key) '
+                    '      - size AS freed FROM entries'
+                    '  ) WHERE freed < ?'
+                    ')',
+                    (excess,)
+                ).rowcount
+
+            self._conn.execute(
+                "UPDATE meta SET value = "
+                "  (SELECT total(size) FROM entries) WHERE name = 'bytes'")
+
+        logger.debug(f'Evicted {deleted} entries from {self.path.name}')
+        return deleted
+
+    def stats(self) -> dict:
+        """Hit rate of this instance and over the cache's lifetime, and size"""
+        hits, misses = self._meta('hits'), self._meta('misses')
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': _rate(self.hits, self.misses),
+            'lifetime_hits': hits,
+            'lifetime_misses': misses,
+            'lifetime_hit_rate': _rate(hits, misses),
+            'entries': len(self),
+            'bytes': self._meta('bytes'),
+            'max_bytes': self.max_bytes
+        }
+
+    def close(self):
+        self._conn.close()
+
+    def _create(self):
+        with self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            # a lost write only costs normalizing a text again
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript('''
+                CREATE TABLE IF NOT EXISTS entries (
+                    key BLOB PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    used REAL NOT NULL
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS entries_used ON entries (used);
+                CREATE TABLE IF NOT EXISTS meta (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+                INSERT OR IGNORE INTO meta VALUES
+                    ('bytes', 0), ('hits', 0), ('misses', 0);
+            ''')
+
+    def _meta(self, name: str) -> int:
+        return self._conn.execute('SELECT value FROM meta WHERE name = ?',
+                                  (name,)).fetchone()[0]
+
+    def _add_meta(self, name: str, value: int):
+        self._conn.execute('UPDATE meta SET value = value + ? WHERE name = ?',
+                           (value, name))
+
+    def _count(self, hits: int, misses: int):
+        self.hits += hits
+        self.misses += misses
+        self._add_meta('hits', hits)
+        self._add_meta('misses', misses)
+
+
+def _rate(hits: int, misses: int) -> float | None:
+    return hits / (hits + misses) if hits + misses > 0 else None
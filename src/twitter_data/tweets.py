@@ -1,31 +1,194 @@
 import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from logging import getLogger
+import numpy as np
 import pandas as pd
+import emoji
 from emoji import replace_emoji
 from unidecode import unidecode
-from twitter_data import TwitterData
+from twitter_data import TwitterData, conf
+from text_cache import TextCache
+import configs
 
 
 logger = getLogger(__name__)
+gconf = configs.read_conf()
+
+# version of normalize_texts()'s output, which addresses cached texts; bump it
+#   whenever normalization changes
+NORM_VERSION = 1
+
+_mention_pat = re.compile(r'@[\w]+[\b ]*')
+_space_pat = re.compile(r'[\t]+|[\n]+')
+# characters of emoji; no emoji spans a space, so stripping emoji word by word
+#   (of the words holding one of them) gives the same text
+_emoji_chars = None
 
 
 class Tweets(TwitterData):
     def __init__(self, data: pd.DataFrame, topic: str, lang: str):
         super().__init__(data, topic, lang)
 
-    def normalize(self, data):
-        return data.loc[:, 'text_orig']\
-            .apply(self.norm_text)\
-            .apply(unidecode)\
-            .rename_cols('text_norm')
+    def normalize(self, workers: int = None, cache: TextCache = None):
+        """
+        Fill 'text_norm' with the normalized 'text_orig' (see normalize_texts())
+
+        :param workers: (optional) processes normalizing chunks of the texts;
+          defaults to the twitterdata config's normalize.workers
+        :param cache: (optional) TextCache of normalized texts, or False to
+          normalize every text; defaults to the general config's
+          file_paths.text_cache if text_cache.enabled (closed once done)
+        """
+        opened = _open_cache(cache)
+        if opened is not None:
+            cache = opened
+
+        try:
+            self.d['text_norm'] = normalize_texts(
+                self.d['text_orig'], workers,
+                cache if cache is not False else None
+            )
+        finally:
+            if opened is not None:
+                opened.close()
+
+        return self
+
+    @staticmethod
+    def stream_normalize(chunks, workers: int = None, cache: TextCache = None):
+        """
+        Normalize each Tweets chunk of @chunks (eg. from .iter_csv()); a
+          single cache is shared by every chunk (see .normalize())
+        """
+        opened = _open_cache(cache)
+        if opened is not None:
+            cache = opened
+
+        try:
+            for chunk in chunks:
+                yield chunk.normalize(workers, cache)
+        finally:
+            if opened is not None:
+                opened.close()
 
     # Must precede unidecode otherwise text formatting might cause issues
     @staticmethod
     def norm_text(tweet):
+        """
+        @tweet without mentions, tabs, newlines and emoji. Until replace_emoji
+          got its arguments in the right order this returned '' for every tweet
+        """
         t = re.sub(r'@[\w]+[\b ]*', '', tweet)
         t = re.sub(r'[\t]+|[\n]+', ' ', t)
         # Props to: https://stackoverflow.com/a/50602709/13557629
-        return replace_emoji(r'', t)
+        return replace_emoji(t, replace='')
+
+
+def _open_cache(cache) -> TextCache | None:
+    """
+    The configured TextCache if @cache is left to default to it (None
+      otherwise); closing it is up to the caller
+    """
+    if cache is None and gconf['text_cache']['enabled']:
+        return TextCache(version=NORM_VERSION)
+
+    return None
+
+
+class _Transliterations(dict):
+    """
+    str.translate() table of unidecode(), filled as characters are first met;
+      unidecode() transliterates one character at a time, so translating with
+      it gives the same text
+    """
+    def __missing__(self, key):
+        value = self[key] = unidecode(chr(key))
+        return value
+
+
+_transliterations = _Transliterations()
+
+
+def normalize_texts(texts: pd.Series,
+                    workers: int = None,
+                    cache: TextCache = None) -> pd.Series:
+    """
+    Batch equivalent of Tweets.norm_text() followed by unidecode(): strip
+      mentions and emoji, collapse tabs and newlines into spaces and
+      transliterate to ASCII. Each distinct text is normalized once, with
+      precompiled patterns; emoji are only looked for in the words holding an
+      emoji character (the stripping of each such word is cached), and ASCII
+      texts skip both steps altogether.
+
+    :param texts: texts to normalize; NA is kept as NA
+    :param workers: (optional) processes normalizing chunks of the distinct
+      texts; defaults to the twitterdata config's normalize.workers
+    :param cache: (optional) TextCache looked up (in bulk) before normalizing;
+      only the texts it misses are normalized, and then cached
+    :return: normalized texts, on the index of @texts
+    """
+    codes, uniques = pd.factorize(texts)
+    uniques = np.asarray(uniques, dtype=object).tolist()
+
+    if cache is None:
+        normed = _normalize_all(uniques, workers)
+    else:
+        keys = cache.keys(uniques)
+        normed = cache.get_many(uniques, keys)
+        missing = [i for i, t in enumerate(normed) if t is None]
+        computed = _normalize_all([uniques[i] for i in missing], workers)
+        for i, t in zip(missing, computed):
+            normed[i] = t
+
+        cache.put_many([uniques[i] for i in missing], computed,
+                       [keys[i] for i in missing])
+        logger.debug(f'Normalized {len(missing)} of {len(uniques)} distinct '
+                     f'texts ({len(uniques) - len(missing)} cached)')
+
+    # NA texts (code -1) take the trailing NA
+    normed = np.array(normed + [pd.NA], dtype=object)
+    return pd.Series(normed[codes], index=texts.index, dtype='string')
+
+
+def _normalize_all(texts: list, workers: int = None) -> list:
+    workers = conf['normalize']['workers'] if workers is None else workers
+
+    if (workers > 1) and (len(texts) >= conf['normalize']['min_pool_rows']):
+        chunks = [list(c) for c in np.array_split(
+            np.array(texts, dtype=object), workers)]
+        with ProcessPoolExecutor(workers) as pool:
+            return [t for c in pool.map(_normalize_list, chunks) for t in c]
+
+    return _normalize_list(texts)
+
+
+def _normalize_list(texts: list) -> list:
+    return [_normalize(t) for t in texts]
+
+
+def _normalize(text: str) -> str:
+    global _emoji_chars
+    if _emoji_chars is None:
+        _emoji_chars = frozenset(c for e in emoji.EMOJI_DATA for c in e
+                                 if not c.isascii())
+
+    t = _mention_pat.sub('', text)
+    if ('\t' in t) or ('\n' in t):
+        t = _space_pat.sub(' ', t)
+    if t.isascii():
+        return t
+
+    if not _emoji_chars.isdisjoint(t):
+        t = ' '.join([w if _emoji_chars.isdisjoint(w) else _replace_emoji(w)
+                      for w in t.split(' ')])
+
+    return t.translate(_transliterations)
+
+
+@lru_cache(maxsize=2**16)
+def _replace_emoji(word: str) -> str:
+    return replace_emoji(word, replace='')
 
 
 if __name__ == '__main__':
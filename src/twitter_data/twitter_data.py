@@ -1,12 +1,18 @@
 import pandas as pd
 from pandas.errors import ParserError
 import csv
+import tempfile
 from logging import getLogger
 from pathlib import Path
-from numpy import ceil, array_split
+import numpy as np
+from numpy import ceil, array_split, arange
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import files
 import configs
+import decoder
+from id_store import IdStore, id_array, integer_ids, default_store_path, \
+    default_text_path
 
 
 # TODO 2/23: not sure if this should stay global here, be made into an
@@ -38,7 +44,9 @@ class TwitterData:
     def update_ids(
             self,
             id_read_path: Path = None,
-            id_write_path: Path = None):
+            id_write_path: Path = None,
+            source_path: Path = None,
+            provenance_path: Path = None):
 
         # TODO 2/28: add some exception handling here. eg. verify that @id_path
         #   points to a valid file
@@ -48,15 +56,71 @@ class TwitterData:
         """
         Update the global set of ids as specified in the general configuration
           (if @id_path is None, otherwise update the set in @id_path).
-        :param id_read_path: (optional) Path object to CSV file holding set of ids
+        The global set is an IdStore; legacy ' '-separated id files (.txt or
+          .csv) are still read and written as text, as are the ids of types
+          whose ids are not integers (eg. places).
+        :param id_read_path: (optional) IdStore directory or legacy id file
         :param id_write_path: (optional) Path to write updated ids
+        :param source_path: (optional) file the updated data is (to be) saved
+          as; its new ids are then recorded in the provenance index
+        :param provenance_path: (optional) ProvenanceIndex directory; defaults
+          to the general config's file_paths.provenance/{data type}
         """
+        integer = integer_ids(self.d['id'])
         if id_read_path is None:
-            id_read_path = files.get_project_root() \
-                           / gconf['file_paths']['twitter_ids'] \
-                           / (self.dtype + '.csv')
+            id_read_path = default_store_path(self.dtype) if integer \
+                else default_text_path(self.dtype)
 
-        existing_ids = self._read_ids(id_read_path)
+        if not IdStore.is_store(id_read_path):
+            self._update_ids_text(id_read_path, id_write_path)
+        elif integer:
+            self._update_ids_store(id_read_path, id_write_path)
+        else:
+            raise ValueError(f'{self.dtype} ids are not integers and cannot '
+                             f'be kept in an IdStore; pass an id file')
+
+        if source_path is not None:
+            self._index_ids(source_path, provenance_path)
+
+    def _index_ids(self, source_path: Path, provenance_path: Path = None):
+        """Record the ids of @self.data as held in @source_path"""
+        # imported here as provenance builds on this module
+        from provenance import ProvenanceIndex
+
+        if provenance_path is None:
+            provenance_path = files.get_project_root() \
+                / gconf['file_paths']['provenance'] \
+                / self.dtype
+
+        ids, valid = id_array(self.d['id'])
+        ProvenanceIndex(provenance_path).add(
+            ids, source_path, np.flatnonzero(valid)
+        )
+
+    def _update_ids_store(self, id_read_path: Path, id_write_path: Path = None):
+        """update_ids() against an IdStore"""
+        store = IdStore(id_read_path)
+        if (id_write_path is not None) and (id_write_path != id_read_path):
+            store = store.copy(id_write_path)
+        previous = len(store)
+
+        ids, valid = id_array(self.d['id'])
+        dups = np.zeros(len(valid), dtype=bool)
+        dups[valid] = store.contains(ids)
+
+        # Remove any records whose id is already present in the store
+        logger.debug(f'Found {dups.sum()} existing entries.')
+        self.d = self.d.loc[~dups].reset_index(drop=True)
+
+        new_ids = store.add(ids[~dups[valid]])
+        logger.info(f'Updated {self.dtype} ids: '
+                    f'previous ({previous}), '
+                    f'new ({len(new_ids)})')
+
+    def _update_ids_text(self, id_read_path: Path, id_write_path: Path = None):
+        """update_ids() against a legacy ' '-separated id file"""
+        existing_ids = self._read_ids(id_read_path) \
+            if id_read_path.is_file() else set()
         # Remove any records whose id is already present in the id file
         self.d = self._remove_ids(existing_ids)
 
@@ -97,7 +161,9 @@ class TwitterData:
             batch=False,
             batch_size=1000,
             batch_num=None,
-            sep_by_type=False) -> list[Path]:
+            sep_by_type=False,
+            workers: int = None,
+            compression: str | bool = None) -> list[Path]:
         """
         Save @self.data into data format specified by @save_format:
           {filename format}
@@ -105,32 +171,35 @@ class TwitterData:
           -{dataframe/batch size}.xlsx
 
         :param path: location to save
-        :param save_format: one of {"csv", "excel"}
+        :param save_format: one of {"csv", "excel", "parquet"}
         :param name_scheme: (optional) alternate filename to use when saving
         :param batch: (def: False) separate dataframe into batches?
         :param batch_size: (if @batch == True) batch size
         :param batch_num: (optional) batch number to append to filename
         :param sep_by_type: (def: False) save into its type directory
           (ie. tweets, twitterdata, etc)
+        :param workers: (if @batch == True) batches written concurrently;
+          defaults to the general config's save.workers
+        :param compression: (if @save_format == "csv") one of {"gzip", "zstd"}
+          or False for plain text; defaults to the general config's
+          csv_compression.method
         :return: path of saved data
         """
 
         try:
             save_paths = []
             data_type = type(self).__name__.lower()
-            sep = gconf['csv_sep']
+            compression = _csv_compression(save_format, compression)
 
             if sep_by_type:
                 path = files.make_dir(path, data_type)
 
             if not batch:
                 name = self._format_filename(
-                    name_scheme, save_format, batch_num, batch_size
+                    name_scheme, save_format, batch_num, batch_size,
+                    compression
                 )
-                if save_format == 'csv':
-                    self.d.to_csv(path / name, sep=sep, index=False)
-                else:
-                    self.d.to_excel(path / name, index=False)
+                _write_frame(self.d, path / name, save_format, compression)
 
                 logger.info(f'Saved dataframe ({name_scheme}) excel sheet into: '
                             f'{files.get_relative_to_proot(path)}')
@@ -138,19 +207,29 @@ class TwitterData:
                 save_paths.append(path/name)
 
             else:
-                bins = ceil(self.shape[0] / batch_size)
+                if workers is None:
+                    workers = gconf['save']['workers']
+
+                bins = int(max(ceil(self.shape[0] / batch_size), 1))
                 # Split into batches of approximately the specified batch size
-                for i, b in enumerate(array_split(self.d, bins)):
+                #   (splitting positions, as numpy 2 returns plain arrays when
+                #   splitting a dataframe)
+                batches = [self.d.iloc[rows]
+                           for rows in array_split(arange(self.shape[0]), bins)]
+                for i, b in enumerate(batches):
                     name = self._format_filename(
-                        name_scheme, save_format, i, b.shape[0]
+                        name_scheme, save_format, i, b.shape[0], compression
                     )
-                    if save_format == 'csv':
-                        b.to_csv(path / name, sep=sep, index=False)
-                    else:
-                        b.to_excel(path / name, index=False)
-
                     save_paths.append(path/name)
 
+                # writers release the GIL while compressing and writing
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    list(pool.map(
+                        lambda job: _write_frame(*job, save_format,
+                                                 compression),
+                        zip(batches, save_paths)
+                    ))
+
                 logger.info(f'Saved {bins} dataframes into: '
                             f'{files.get_relative_to_proot(path)}')
 
@@ -168,21 +247,18 @@ class TwitterData:
             name_scheme: str,
             save_format: str,
             batch_num: int|None,
-            batch_size: int|None):
+            batch_size: int|None,
+            compression: str = None):
         """
         Create a standardized filename to use for saving data
         :param name_scheme:
-        :param save_format: one of {"csv", "excel"}
+        :param save_format: one of {"csv", "excel", "parquet"}
         :param batch_num:
         :param batch_size:
+        :param compression: (optional) one of {"gzip", "zstd"}
         """
         data_type = type(self).__name__.lower()
-        if save_format == 'csv':
-            ext = '.csv'
-        elif save_format == 'excel':
-            ext = '.xlsx'
-        else:
-            raise ValueError(f'Invalid save format ({save_format})')
+        ext = _extension(save_format, compression)
 
         if name_scheme is None:
             # format the filename as specified in config file
@@ -193,7 +269,7 @@ class TwitterData:
             )
 
         # Remove the file format to append dataframe size
-        name_scheme = Path(name_scheme).stem
+        name_scheme = _strip_extension(name_scheme)
 
         if batch_num is not None:
             name_scheme = f'{name_scheme}-{batch_num}'
@@ -211,9 +287,12 @@ class TwitterData:
                  subset: list = None,
                  dtypes: dict = None,
                  dates: list = None,
+                 date_format: str = None,
                  lineterminator=None):
         """
-        Optimized version utilizing pandas.read_csv() with dtypes specified
+        Optimized version utilizing pandas.read_csv() with dtypes specified;
+          gzip and zstd compressed CSVs (.csv.gz, .csv.zst) are decompressed
+          transparently
 
         :param path: path to CSV
         :param lang: language of dataset ('es' or 'pt')
@@ -223,10 +302,11 @@ class TwitterData:
         :param dtypes: (optional) dict of {column: dtype}; used to pass custom
           dtype specs for "unconventional" dataframes
         :param dates: (optional) list of date columns to parse
+        :param date_format: (optional) strftime format of @dates; detected from
+          a sample of each column (and cached per file) if None
         :param lineterminator: (optional) use '\n' if failing to read CSVs
         :return: dataframe
         """
-        date_formats = conf['date_formats']
         sep = gconf['csv_sep']
 
         if dtypes is None:
@@ -250,45 +330,170 @@ class TwitterData:
             on_bad_lines='warn'
         )
 
-        # If @dates columns in @data, the convert to datetime
-        if set(dates).issubset(data.columns):
-            try:
-                data.loc[:, dates] = data.loc[:, dates].apply(
-                    pd.to_datetime,
-                    format=date_formats['cleaned'],
-                    utc=True
-                )
-            except (ParserError, ValueError):
-                data.loc[:, dates] = data.loc[:, dates].apply(
-                    pd.to_datetime,
-                    format=date_formats['extracted'],
-                    utc=True
-                )
-            try:
-                # Remove timezone information as it conflicts with saving
-                #   in Excel
-                for d in dates:
-                    data[d] = data[d].dt.tz_localize(None)
-            except AttributeError as e:
-                logger.exception(e.args)
-                raise
+        return cls(_parse_dates(data, dates, date_format, path), topic, lang)
+
+    @classmethod
+    def from_csvs(cls,
+                  paths: list[Path],
+                  lang,
+                  topic=None,
+                  workers: int = None,
+                  **kwargs):
+        """
+        Load and concatenate several (possibly compressed) CSVs with
+          .from_csv(), decompressing and parsing them concurrently
+
+        :param paths: paths to CSVs
+        :param lang: language of dataset ('es' or 'pt')
+        :param topic: (optional) name to give the dataframe; taken from the
+          first file's name if None
+        :param workers: (optional) files read at once; defaults to the general
+          config's csv_compression.workers
+        :param kwargs: passed on to .from_csv()
+        :return: dataframe
+        """
+        if topic is None:
+            topic = extract_verb_from_filename(paths[0])
+
+        loaded = files.read_concurrently(
+            lambda p: cls.from_csv(p, lang, topic, **kwargs).d,
+            paths,
+            workers
+        )
 
-        return cls(data, topic, lang)
+        return cls(pd.concat(loaded, ignore_index=True), topic, lang)
+
+    @classmethod
+    def iter_csv(cls,
+                 path: Path,
+                 lang,
+                 topic=None,
+                 chunksize: int = None,
+                 subset: list = None,
+                 dtypes: dict = None,
+                 dates: list = None,
+                 date_format: str = None,
+                 lineterminator=None):
+        """
+        Read a CSV in chunks of @chunksize rows, with the same dtype and date
+          handling as .from_csv(); only one chunk is held in memory at a time
+
+        :param path: path to CSV
+        :param lang: language of dataset ('es' or 'pt')
+        :param topic: (optional) name to give the chunks; used when writing
+          to file
+        :param chunksize: (optional) rows per chunk; defaults to the config's
+          stream.chunksize
+        :param subset: (optional) subset of the columns to return
+        :param dtypes: (optional) dict of {column: dtype}
+        :param dates: (optional) list of date columns to parse
+        :param date_format: (optional) strftime format of @dates; detected from
+          the first chunk if None
+        :param lineterminator: (optional) use '\n' if failing to read CSVs
+        :return: generator of @cls
+        """
+        sep = gconf['csv_sep']
+
+        if chunksize is None:
+            chunksize = conf['stream']['chunksize']
+        if dtypes is None:
+            dtypes = conf['dtypes']['twitter']['regular']
+        if dates is None:
+            dates = conf['dtypes']['twitter']['dates']
+
+        if topic is None:
+            topic = extract_verb_from_filename(path)
+            if topic is None:
+                raise ValueError(f'Cannot identify dataframe topic from '
+                                 f'filename -- pass into @topic')
+
+        with pd.read_csv(
+            path,
+            usecols=subset,
+            dtype=dtypes,
+            sep=sep,
+            lineterminator=lineterminator,
+            on_bad_lines='warn',
+            chunksize=chunksize
+        ) as reader:
+            for chunk in reader:
+                yield cls(_parse_dates(chunk, dates, date_format, path),
+                          topic, lang)
+
+    @classmethod
+    def from_parquet(cls,
+                     path: Path,
+                     lang,
+                     topic=None,
+                     columns: list = None,
+                     filters: list = None,
+                     dtypes: dict = None):
+        """
+        Load data saved with .save(save_format='parquet'). Only the requested
+          columns are read, and row groups whose statistics rule out
+          @filters are skipped entirely
+
+        :param path: path to a parquet file (or a directory of them)
+        :param lang: language of dataset ('es' or 'pt')
+        :param topic: (optional) name to give the dataframe; used when writing
+          to file
+        :param columns: (optional) columns to read, eg. the processing
+          config's 'analysis_cols'; columns missing from the file are ignored
+        :param filters: (optional) row filters as accepted by
+          pyarrow.parquet.read_table, eg.
+          [('lang', '==', 'es'), ('created_at', '>=', pd.Timestamp('2023'))]
+        :param dtypes: (optional) dict of {column: dtype}; defaults to the
+          twitter dtypes in the config
+        :return: dataframe
+        """
+        import pyarrow.parquet as pq
+
+        if dtypes is None:
+            dtypes = conf['dtypes']['twitter']['regular']
+
+        if topic is None:
+            topic = extract_verb_from_filename(path)
+            if topic is None:
+                raise ValueError(f'Cannot identify dataframe topic from '
+                                 f'filename -- pass into @topic')
+
+        if columns is not None:
+            available = set(pq.read_schema(path).names) if path.is_file() \
+                else set(pq.ParquetDataset(path).schema.names)
+            columns = [c for c in columns if c in available]
+
+        data = pq.read_table(path, columns=columns, filters=filters) \
+            .to_pandas(types_mapper=arrow_struct_types)
+
+        return cls(apply_dtypes(data, dtypes), topic, lang)
 
     @classmethod
     def from_json(cls, json_data, topic, lang):
         return cls(pd.json_normalize(json_data), topic, lang)
 
+    @classmethod
+    def from_records(cls, records: list[dict], topic, lang):
+        """
+        Build from a list of Twitter v2 JSON objects with the schema-driven
+          decoder; falls back to .from_json() for types without a schema
+        """
+        data_type = cls.__name__.lower()
+        if data_type not in conf['schemas']:
+            return cls.from_json(records, topic, lang)
+
+        return cls(decoder.decode(records, data_type), topic, lang)
+
     def _remove_ids(self, ids: set):
         """
         Remove entries from @self.data where 'id' is in @ids
         """
-        d_ids = set(self.d['id'].unique().astype(str))
-        dup_ids = ids.intersection(d_ids)
+        str_ids = self.d['id'].astype(str)
+        dup_ids = ids.intersection(str_ids.unique())
 
         logger.debug(f'Found {len(dup_ids)} existing entries.')
 
-        dups = self.d.loc[self.d['id'].isin(dup_ids), :].index
+        # @ids are strings; compare against the ids' string form
+        dups = self.d.loc[str_ids.isin(dup_ids), :].index
         df = self.d.drop(index=dups).reset_index(drop=True)
 
         logger.debug(f'Returning {self.dtype} with {df.shape[0]} unique entries.')
@@ -309,6 +514,7 @@ class TwitterData:
         all_ids = existing_ids.union(data_ids)
 
         t_ids = ' '.join(i for i in all_ids)
+        path.parent.mkdir(parents=True, exist_ok=True)
         path.write_text(t_ids)
 
         logger.info(f'Updated {self.dtype} ids; total: '
@@ -316,6 +522,465 @@ class TwitterData:
                     f'= {len(all_ids)}')
 
 
+def stream_update_ids(
+        chunks,
+        id_read_path: Path = None,
+        id_write_path: Path = None):
+    """
+    Streaming counterpart of TwitterData.update_ids(): drop the records of
+      each chunk whose id was already seen (in the id set or in an earlier
+      chunk). The updated set is written only once every chunk has been
+      consumed
+
+    :param chunks: iterable of TwitterData (eg. from .iter_csv())
+    :param id_read_path: (optional) IdStore directory or legacy id file;
+      defaults to the general config's file_paths.twitter_ids/{data type}
+      (an id file for types whose ids are not integers)
+    :param id_write_path: (optional) Path to write updated ids
+    :return: generator of the deduplicated chunks
+    """
+    store, text_ids, seen = None, None, None
+    previous = 0
+
+    with tempfile.TemporaryDirectory(prefix='seen-ids-') as tmp:
+        for chunk in chunks:
+            if (store is None) and (text_ids is None):
+                integer = integer_ids(chunk.d['id'])
+                if id_read_path is None:
+                    id_read_path = default_store_path(chunk.dtype) \
+                        if integer else default_text_path(chunk.dtype)
+
+                if not IdStore.is_store(id_read_path):
+                    text_ids = chunk._read_ids(id_read_path) \
+                        if id_read_path.is_file() else set()
+                    previous = len(text_ids)
+                elif integer:
+                    store = IdStore(id_read_path)
+                    previous = len(store)
+                    # ids of earlier chunks, added to @store only once every
+                    #   chunk has been consumed
+                    seen = IdStore(Path(tmp))
+                else:
+                    raise ValueError(f'{chunk.dtype} ids are not integers '
+                                     f'and cannot be kept in an IdStore; '
+                                     f'pass an id file')
+
+            # duplicates within the chunk itself
+            chunk.d = chunk.d.drop_duplicates(subset='id', ignore_index=True)
+
+            if store is None:
+                chunk.d = chunk._remove_ids(text_ids)
+                text_ids.update(chunk.d['id'].astype(str))
+            else:
+                ids, valid = id_array(chunk.d['id'])
+                dups = np.zeros(len(valid), dtype=bool)
+                dups[valid] = store.contains(ids) | seen.contains(ids)
+
+                chunk.d = chunk.d.loc[~dups].reset_index(drop=True)
+                seen.add(ids[~dups[valid]])
+
+            yield chunk
+
+        if store is not None:
+            if (id_write_path is not None) and (id_write_path != id_read_path):
+                store = store.copy(id_write_path)
+            store.add(seen.to_array())
+
+    if store is not None:
+        total = len(store)
+    elif text_ids is not None:
+        path = id_read_path if id_write_path is None else id_write_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(' '.join(text_ids))
+        total = len(text_ids)
+    else:
+        return
+
+    logger.info(f'Updated ids; total: {previous}(existing) + '
+                f'{total - previous}(new) = {total}')
+
+
+def stream_save(
+        chunks,
+        path: Path,
+        save_format: str = 'csv',
+        name_scheme: str = None,
+        compression: str | bool = None) -> Path:
+    """
+    Streaming counterpart of TwitterData.save(): append every chunk to a
+      single file, named as .save() would name the concatenated data
+
+    :param chunks: iterable of TwitterData (eg. from .iter_csv())
+    :param path: location to save
+    :param save_format: one of {"csv", "parquet"}
+    :param name_scheme: (optional) alternate filename to use when saving
+    :param compression: (if @save_format == "csv") as in TwitterData.save()
+    :return: path of saved data (None if @chunks was empty)
+    """
+    if save_format not in {'csv', 'parquet'}:
+        raise ValueError(f'Cannot stream into {save_format}')
+
+    sep = gconf['csv_sep']
+    compression = _csv_compression(save_format, compression)
+    ext = _extension(save_format, compression)
+    tmp, first, writer = None, None, None
+    rows = 0
+
+    try:
+        for chunk in chunks:
+            if first is None:
+                first = chunk
+                # the final name holds the total size; unknown until the end
+                tmp = path / (chunk._format_filename(
+                    name_scheme, save_format, None, None, compression)
+                    + '.part')
+
+            if save_format == 'csv':
+                # compressed chunks are appended as separate frames (members)
+                #   of the same file, which decompress as one stream
+                chunk.d.to_csv(tmp, sep=sep, index=False,
+                               mode='w' if rows == 0 else 'a',
+                               header=(rows == 0),
+                               compression=_pandas_compression(compression))
+            else:
+                writer = _write_parquet_chunk(chunk.d, tmp, writer)
+
+            rows += chunk.shape[0]
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if first is None:
+        return None
+
+    name = tmp.name[:-len(ext + '.part')]
+    saved = path / f'{name}-{rows}{ext}'
+    tmp.replace(saved)
+
+    logger.info(f'Streamed {rows} rows into: '
+                f'{files.get_relative_to_proot(saved)}')
+    return saved
+
+
+def sniff_date_format(values: pd.Series, sample: int = None) -> str | None:
+    """
+    Find which of the config's date_formats parses a small sample of @values
+
+    :param values: dates as strings
+    :param sample: (optional) non-null values tried; defaults to the config's
+      date_sample
+    :return: the matching format, or None if none matches (or no values)
+    """
+    if sample is None:
+        sample = conf['date_sample']
+
+    head = values.dropna().head(sample)
+    if len(head) == 0:
+        return None
+
+    for fmt in conf['date_formats'].values():
+        try:
+            pd.to_datetime(head, format=fmt)
+            return fmt
+        except (ParserError, ValueError):
+            continue
+
+    return None
+
+
+def _parse_dates(data: pd.DataFrame,
+                 dates: list,
+                 date_format: str = None,
+                 path: Path = None) -> pd.DataFrame:
+    """
+    Convert the @dates columns of @data (if all present) to timezone-naive
+      datetimes in a single pass per column. Without a @date_format, the
+      format is sniffed from a sample of each column and cached for @path
+      (until the file changes)
+    """
+    if not set(dates).issubset(data.columns):
+        return data
+
+    key = _file_key(path)
+
+    for col in dates:
+        fmt = date_format
+        if (fmt is None) and (key is not None):
+            fmt = _date_format_cache.get((key, col))
+        if fmt is None:
+            fmt = sniff_date_format(data[col])
+            if (fmt is not None) and (key is not None):
+                _date_format_cache[(key, col)] = fmt
+
+        data[col] = _to_naive_datetime(data[col], fmt)
+
+    return data
+
+
+# {((path, modification time), date column): format} of the files loaded
+_date_format_cache = dict()
+
+
+def _file_key(path: Path | None):
+    """Identifies @path's current contents; None if not a file"""
+    try:
+        return str(path), path.stat().st_mtime_ns
+    except (AttributeError, OSError, TypeError):
+        return None
+
+
+def _to_naive_datetime(values: pd.Series, fmt: str | None) -> pd.Series:
+    """
+    Parse @values with the exact @fmt; timezone-aware formats are converted
+      to UTC and made naive, as timezones conflict with saving in Excel
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.dt.tz_convert(None) if values.dt.tz is not None \
+            else values
+
+    if fmt is not None:
+        aware = '%z' in fmt
+        # a trailing literal (eg. the 'Z' of the extracted format) keeps
+        #   pandas off its fast ISO path; strip it from both sides
+        suffix = fmt[fmt.rfind('%') + 2:]
+        try:
+            if len(suffix) > 0:
+                parsed = pd.to_datetime(values.str.removesuffix(suffix),
+                                        format=fmt[:-len(suffix)], utc=aware)
+            else:
+                parsed = pd.to_datetime(values, format=fmt, utc=aware)
+            return parsed.dt.tz_localize(None) if aware else parsed
+        except (ParserError, ValueError) as e:
+            logger.warning(f'Dates of "{values.name}" do not all match '
+                           f'{fmt}; parsing them one by one. {e.args}')
+
+    parsed = pd.to_datetime(values, format='mixed', utc=True)
+    return parsed.dt.tz_localize(None)
+
+
+def _write_parquet_chunk(data: pd.DataFrame, path: Path, writer=None):
+    """
+    Append @data to the parquet file at @path as new row groups; opens the
+      writer (with the schema of @data) if @writer is None
+    :return: the writer, to be closed once done
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    pconf = gconf['parquet']
+
+    if writer is None:
+        table = pa.Table.from_pandas(data, preserve_index=False)
+        writer = pq.ParquetWriter(path, table.schema,
+                                  **_parquet_options(data))
+    else:
+        table = pa.Table.from_pandas(data, schema=writer.schema,
+                                     preserve_index=False)
+
+    writer.write_table(table, row_group_size=pconf['row_group_size'])
+    return writer
+
+
+def _write_frame(data: pd.DataFrame,
+                 path: Path,
+                 save_format: str,
+                 compression: str = None):
+    """Write @data to @path as @save_format"""
+    if save_format == 'csv':
+        data.to_csv(path, sep=gconf['csv_sep'], index=False,
+                    compression=_pandas_compression(compression))
+    elif save_format == 'parquet':
+        _to_parquet(data, path)
+    else:
+        _to_excel(data, path)
+
+
+_extensions = {'csv': '.csv', 'excel': '.xlsx', 'parquet': '.parquet'}
+_compression_extensions = {'gzip': '.gz', 'zstd': '.zst'}
+
+
+def _extension(save_format: str, compression: str = None) -> str:
+    """File extension of @save_format (compressed with @compression)"""
+    if save_format not in _extensions:
+        raise ValueError(f'Invalid save format ({save_format})')
+
+    return _extensions[save_format] \
+        + _compression_extensions.get(compression, '')
+
+
+def _strip_extension(name: str) -> str:
+    """@name without its (possibly compressed) data file extension"""
+    name = Path(name).name
+    for ext in _compression_extensions.values():
+        name = name.removesuffix(ext)
+
+    return Path(name).stem
+
+
+def _csv_compression(save_format: str, compression: str | bool = None):
+    """
+    Compression method to save @save_format with: @compression, else the
+      general config's csv_compression.method (CSVs only); None for none
+    """
+    if save_format != 'csv':
+        return None
+    if compression is None:
+        compression = gconf['csv_compression']['method']
+    if not compression:
+        return None
+
+    if compression not in _compression_extensions:
+        raise ValueError(f'Invalid CSV compression ({compression})')
+    return compression
+
+
+def _pandas_compression(compression: str | None) -> dict | None:
+    """pandas' compression options of @compression, at the config's level"""
+    if compression is None:
+        return None
+
+    level = gconf['csv_compression']['levels'][compression]
+    if compression == 'gzip':
+        return {'method': 'gzip', 'compresslevel': level}
+
+    return {'method': 'zstd', 'level': level}
+
+
+# rows of an xlsx sheet, header included
+_EXCEL_MAX_ROWS = 1048576
+
+
+def _to_excel(data: pd.DataFrame, path: Path):
+    """
+    Stream @data into an xlsx workbook row by row, so that memory use does not
+      grow with the size of the workbook; a new sheet (with its own header) is
+      started whenever one reaches the xlsx row limit
+    """
+    from openpyxl import Workbook
+
+    chunk_rows = gconf['save']['excel_chunk']
+    header = [str(c) for c in data.columns]
+
+    wb = Workbook(write_only=True)
+    sheet, sheet_rows = None, _EXCEL_MAX_ROWS
+
+    for start in range(0, max(data.shape[0], 1), chunk_rows):
+        chunk = data.iloc[start:start + chunk_rows]
+        # openpyxl writes None as an empty cell, but not pd.NA or NaT
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        # nor lists or dicts (eg. 'entities.mentions'); written as their str()
+        #   as DataFrame.to_excel() does
+        for col in data.columns[data.dtypes == object]:
+            chunk[col] = chunk[col].map(_excel_cell)
+
+        for row in chunk.itertuples(index=False, name=None):
+            if sheet_rows >= _EXCEL_MAX_ROWS:
+                sheet = wb.create_sheet(f'Sheet{len(wb.worksheets) + 1}')
+                sheet.append(header)
+                sheet_rows = 1
+
+            sheet.append(row)
+            sheet_rows += 1
+
+    if sheet is None:
+        # empty dataframe; keep the header
+        wb.create_sheet('Sheet1').append(header)
+
+    wb.save(path)
+
+
+def _excel_cell(value):
+    """@value as openpyxl can write it: non-scalar values as their str()"""
+    if isinstance(value, (list, tuple, dict, set, np.ndarray)):
+        return str(value)
+
+    return value
+
+
+def _to_parquet(data: pd.DataFrame, path: Path):
+    """
+    Write @data as parquet with the row group size and compression of the
+      general config, so that loaders can skip row groups by their statistics
+    """
+    data.to_parquet(
+        path,
+        index=False,
+        row_group_size=gconf['parquet']['row_group_size'],
+        **_parquet_options(data)
+    )
+
+
+def _parquet_options(data: pd.DataFrame) -> dict:
+    """
+    Codec and column encodings of the general config's parquet settings:
+      only columns with few distinct values are dictionary encoded, and
+      sorted integer and date columns (eg. ids, 'created_at') are stored as
+      deltas
+    """
+    pconf = gconf['parquet']
+    max_distinct = pconf['dictionary_max_ratio'] * len(data)
+
+    dictionary, delta = [], dict()
+    for col in data.columns:
+        values = data[col]
+        if isinstance(values.dtype, pd.ArrowDtype):
+            # nested (struct) columns keep the default encoding
+            continue
+        if (pd.api.types.is_integer_dtype(values)
+                or pd.api.types.is_datetime64_any_dtype(values)) \
+                and (values.is_monotonic_increasing
+                     or values.is_monotonic_decreasing):
+            delta[col] = 'DELTA_BINARY_PACKED'
+        elif _nunique(values) <= max_distinct:
+            dictionary.append(col)
+
+    return {'compression': pconf['compression'],
+            'compression_level': pconf['compression_level'],
+            'use_dictionary': dictionary,
+            'column_encoding': delta}
+
+
+def _nunique(values: pd.Series) -> float:
+    """Distinct values of @values (inf if they can't be hashed, eg. lists)"""
+    try:
+        return values.nunique()
+    except TypeError:
+        return float('inf')
+
+
+def arrow_struct_types(arrow_type):
+    """
+    types_mapper of pyarrow's Table.to_pandas(): keeps struct columns (eg.
+      those of cleaning.pack_cols) as pd.ArrowDtype, which pandas can't
+      rebuild from the parquet metadata on its own
+    """
+    import pyarrow as pa
+
+    return pd.ArrowDtype(arrow_type) if pa.types.is_struct(arrow_type) \
+        else None
+
+
+def apply_dtypes(data: pd.DataFrame, dtypes: dict = None) -> pd.DataFrame:
+    """
+    Convert the columns of @data whose dtype differs from @dtypes (defaults
+      to the twitter dtypes in the config); 'object' columns are left as is
+    """
+    if dtypes is None:
+        dtypes = conf['dtypes']['twitter']['regular']
+
+    # the pandas metadata in parquet files normally restores the dtypes; only
+    #   convert columns that were saved with a different one (packed struct
+    #   columns are kept as they are)
+    convert = {c: t for c, t in dtypes.items()
+               if (c in data.columns) and (t != 'object')
+               and (str(data[c].dtype) != t)
+               and not isinstance(data[c].dtype, pd.ArrowDtype)}
+    if len(convert) > 0:
+        data = data.astype(convert)
+
+    return data
+
+
 def convert_dtypes(df: pd.DataFrame, type_map: dict) -> pd.DataFrame:
     # TODO 4/3/2023: see if method is necessary - if so, update
 
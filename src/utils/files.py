@@ -1,6 +1,7 @@
 from pathlib import Path
 from logging import getLogger
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import regex as re
 import configs
@@ -156,6 +157,24 @@ def _select_folders(dir: Path) -> list[Path]:
             print('Select valid folder(s) (or "a" for all)')
 
 
+def read_concurrently(read, paths: list[Path], workers: int = None) -> list:
+    """
+    Apply @read to each of @paths on a thread pool; decompression and
+      parsing release the GIL, so compressed files load in parallel
+
+    :param read: function taking a path
+    :param paths: files to read
+    :param workers: (optional) files read at once; defaults to the general
+      config's csv_compression.workers
+    :return: results, in the order of @paths
+    """
+    if workers is None:
+        workers = configs.read_conf()['csv_compression']['workers']
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(read, paths))
+
+
 def make_dir(dir_path,
              name_scheme,
              date: str = None) -> Path:
@@ -0,0 +1,173 @@
+import dedup
+import cleaning
+import near_dups
+from tweets import Tweets
+import files
+import pandas as pd
+from pathlib import Path
+import tempfile
+import pytest
+
+
+"""--------------------fixtures--------------------"""
+@pytest.fixture
+def corpus_path():
+    # within the project, as save() logs paths relative to its root
+    samples = files.get_project_root() / 'tests' / 'samples'
+    with tempfile.TemporaryDirectory(dir=samples) as tmp:
+        yield Path(tmp)
+
+
+def write_folder(path: Path, name: str, files_ids: list[list[int]]) -> list:
+    """Folder @name of tweet files holding @files_ids; returns the frames"""
+    folder = path / name
+    folder.mkdir()
+    frames = []
+    for i, ids in enumerate(files_ids):
+        data = pd.DataFrame({'id': [str(x) for x in ids],
+                             'text': [f'texto {x}' for x in ids]})
+        data.to_csv(folder / f'es-parecer-tweets-{i}.csv', sep='~',
+                    index=False)
+        frames.append(data)
+
+    return frames
+
+
+@pytest.fixture
+def near_dup_data():
+    texts = ['hoy parece que va a llover mucho en la ciudad',
+             'mañana quiero ir a la playa con la gente',
+             'hoy parece que va a llover mucho en la ciudad!',
+             None, 'hola', 'hola']
+    return pd.DataFrame({
+        'id': pd.array([11, 12, 13, 14, 15, 16], dtype='UInt64'),
+        'text_norm': pd.array(texts, dtype='string')
+    })
+
+
+"""--------------------tests--------------------"""
+def test_dedup_folders(corpus_path):
+    frames = write_folder(corpus_path, 'a', [[1, 2, 2, 3], [4, 1]])
+    frames += write_folder(corpus_path, 'b', [[5, 3, 6], [], [6, 7]])
+
+    original, dups = dedup.dedup_folders(corpus_path, 'tweets', 'id',
+                                         buckets=3, chunksize=2)
+    expected = pd.concat(frames, ignore_index=True)
+    assert (original, dups) == (len(expected), expected.duplicated().sum())
+
+    # a later folder is checked against the folders cleaned before
+    later = write_folder(corpus_path, 'c', [[7, 8, 1, 8]])
+    original, dups = dedup.dedup_folders(corpus_path, 'tweets', 'id',
+                                         buckets=3, chunksize=2)
+    everything = pd.concat(frames + later, ignore_index=True)
+    assert (original, dups) == (4, everything.duplicated().sum()
+                                - expected.duplicated().sum())
+
+    cleaned = pd.concat(
+        [pd.read_csv(p, sep='~', dtype=str)
+         for p in sorted(corpus_path.glob('*/*-cleaned-*'))],
+        ignore_index=True
+    )
+    assert cleaned['id'].tolist() == ['1', '2', '3', '4', '5', '6', '7', '8']
+
+
+def test_dedup_then_folder_dup_clean(corpus_path):
+    write_folder(corpus_path, 'a', [[1, 2, 2]])
+    assert dedup.dedup_folders(corpus_path, 'tweets', 'id') == (3, 1)
+
+    # the dedup state file next to the folders is no folder to clean
+    write_folder(corpus_path, 'b', [[3, 4, 3]])
+    assert (corpus_path / '.dedup-state.json').is_file()
+    assert cleaning.folder_dup_clean(set(), corpus_path, 'tweets', 'id',
+                                     workers=1) == (3, 1)
+
+
+def test_dedup_folders_empty(corpus_path):
+    # files holding only a header leave every bucket empty
+    write_folder(corpus_path, 'a', [[], []])
+
+    assert dedup.dedup_folders(corpus_path, 'tweets', 'id') == (0, 0)
+
+
+def test_pack_cols(corpus_path):
+    cols = ['public_metrics.retweet_count', 'public_metrics.reply_count',
+            'public_metrics.like_count', 'public_metrics.quote_count']
+    counts = [[3, 0, 12, 1], [0, 5, 0, 0], [7, 1, 2, 4]]
+    data = pd.DataFrame(counts, columns=cols)
+    data.insert(0, 'id', pd.array([1, 2, 3], dtype='UInt64'))
+    combine_map = {'retweet_reply_like_quote': cols}
+
+    packed = cleaning.pack_cols(data, combine_map)
+    legacy = data.apply(cleaning.combine_cols, axis=1, args=(cols,))
+
+    # same text as the row-wise packing, which data is left without
+    assert packed['retweet_reply_like_quote'].tolist() == \
+        [str(tuple(int(v) for v in t)) for t in legacy]
+    assert 'retweet_reply_like_quote' not in data.columns
+    # legacy texts (eg. of numpy scalars) are read back too
+    unpacked = cleaning.unpack_cols(
+        pd.DataFrame({'retweet_reply_like_quote': legacy.astype(str)}),
+        combine_map
+    )
+    assert unpacked[cols].astype('int64').equals(data[cols])
+
+    # NA packed as 'nan' and read back as NA
+    data.loc[1, cols[2]] = None
+    packed = cleaning.pack_cols(data, combine_map, drop=True)
+    assert packed['retweet_reply_like_quote'][1] == '(0, 5, nan, 0)'
+    assert list(packed.columns) == ['id', 'retweet_reply_like_quote']
+    assert cleaning.unpack_cols(packed, combine_map)[cols[2]].isna() \
+        .tolist() == [False, True, False]
+
+    # the struct form round-trips through parquet
+    packed = cleaning.pack_cols(data, combine_map, form='struct', drop=True)
+    path = Tweets(packed, 'packed', 'es').save(corpus_path, 'parquet')[0]
+    read = Tweets.from_parquet(path, 'es', topic='packed').d
+    assert isinstance(read['retweet_reply_like_quote'].dtype, pd.ArrowDtype)
+    restored = cleaning.unpack_cols(read, combine_map)
+    assert restored[cols].equals(data[cols].astype('UInt32'))
+
+
+def test_near_dups(near_dup_data):
+    labels = near_dups.near_dup_clusters(near_dup_data['text_norm'], seed=0)
+    # NA and texts shorter than a shingle are never grouped
+    assert labels.tolist() == [0, 1, 0, 3, 4, 5]
+
+    flagged, count = near_dups.mark_near_dups(near_dup_data, 'flag', seed=0)
+    assert count == 1
+    # the input frame is not modified
+    assert 'near_dup_of' not in near_dup_data.columns
+    assert flagged['near_dup_of'].tolist() == \
+        [pd.NA, pd.NA, 11, pd.NA, pd.NA, pd.NA]
+    assert flagged['near_dup_of'].dtype == 'UInt64'
+
+    dropped, count = near_dups.mark_near_dups(near_dup_data, 'drop', seed=0)
+    assert count == 1
+    assert dropped['id'].tolist() == [11, 12, 14, 15, 16]
+
+    with pytest.raises(ValueError):
+        near_dups.mark_near_dups(near_dup_data, 'keep')
+
+
+def test_folder_dup_clean_near_dups(corpus_path, near_dup_data):
+    folder = corpus_path / 'a'
+    folder.mkdir()
+    # an exact duplicate of the first tweet as well
+    data = pd.concat([near_dup_data, near_dup_data.iloc[:1]])
+    data.to_csv(folder / 'es-parecer-tweets-0.csv', sep='~', index=False)
+
+    totals = cleaning.folder_dup_clean(set(), corpus_path, 'tweets', 'id',
+                                       delete_original=False, workers=1,
+                                       near_dup_action='drop')
+    assert totals == (7, 2)
+    cleaned = [pd.read_csv(p, sep='~') for p in folder.glob('*-cleaned-*')]
+    assert cleaned[0]['id'].tolist() == [11, 12, 14, 15, 16]
+
+    for p in folder.glob('*-cleaned-*'):
+        p.unlink()
+    totals = cleaning.folder_dup_clean(set(), corpus_path, 'tweets', 'id',
+                                       delete_original=False, workers=1,
+                                       near_dup_action='flag')
+    assert totals == (7, 1)
+    cleaned = [pd.read_csv(p, sep='~') for p in folder.glob('*-cleaned-*')]
+    assert cleaned[0]['near_dup_of'].tolist()[2] == 11
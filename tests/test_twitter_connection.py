@@ -0,0 +1,359 @@
+from mock_server import MockTwitterServer
+from connection import TwitterConnection
+from checkpoint import Checkpoint
+from harvester import Harvester
+from writer import BatchWriter
+from journal import ResponseJournal, replay
+from rate_limit import RateLimiter
+from key_pool import KeyPool, PooledConnection
+import rate_limit
+import connection
+import configs
+import files
+import pandas as pd
+import requests
+from pathlib import Path
+import tempfile
+import threading
+from time import perf_counter, sleep, time
+from types import SimpleNamespace
+import pytest
+
+
+"""--------------------fixtures--------------------"""
+@pytest.fixture(scope='module')
+def query():
+    return 'parecer', 'parecer -is:retweet'
+
+
+@pytest.fixture(scope='module')
+def mock():
+    with MockTwitterServer(pages=4, page_size=20, latency=0) as server:
+        yield server
+
+
+@pytest.fixture
+def save_path():
+    # within the project, as save() logs paths relative to its root
+    samples = files.get_project_root() / 'tests' / 'samples'
+    with tempfile.TemporaryDirectory(dir=samples) as tmp:
+        yield Path(tmp)
+
+
+def response(status_code: int, **headers) -> SimpleNamespace:
+    """Stand-in of a requests.Response with @headers (x_rate_limit_reset=...)"""
+    return SimpleNamespace(
+        status_code=status_code,
+        headers={k.replace('_', '-'): str(v) for k, v in headers.items()},
+        text=''
+    )
+
+
+"""--------------------tests--------------------"""
+def test_rate_limiter_pacing(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(rate_limit, 'sleep', sleeps.append)
+    limiter = RateLimiter(reserve=1)
+
+    # nothing reported yet: no pacing
+    limiter.wait()
+    assert (limiter.available(), sleeps) == (float('inf'), [])
+
+    # 5 requests (1 in reserve) left over 100s: spread 25s apart
+    reset = int(time()) + 100
+    limiter.record(response(200, x_rate_limit_limit=10,
+                            x_rate_limit_remaining=5, x_rate_limit_reset=reset))
+    assert limiter.available() == 4
+    limiter.wait()
+    limiter.wait()
+    assert len(sleeps) == 1 and 23 < sleeps[0] <= 25
+
+    # down to the reserve: wait out the window
+    limiter.update({'x-rate-limit-remaining': '1'})
+    limiter.wait()
+    assert len(sleeps) == 2 and sleeps[-1] > 90
+
+
+def test_rate_limiter_retry_delay():
+    limiter = RateLimiter(backoff_base=1, backoff_max=4)
+
+    # without a reset header: exponential backoff, capped
+    assert [limiter.retry_delay(response(429), a) for a in range(5)] == \
+        [1, 2, 4, 4, 4]
+    assert limiter.retry_delay(response(503), 1) == 2
+    assert limiter.is_retryable(503) and not limiter.is_retryable(404)
+
+    # with one: wait for the reset, even past backoff_max
+    delay = limiter.retry_delay(
+        response(429, x_rate_limit_reset=int(time()) + 30), 0)
+    assert 29 < delay <= 31
+
+
+def test_paginate_resume(mock, query, save_path):
+    con = TwitterConnection('es', key='test', host=mock.url)
+    stream = [t['id'] for p in range(mock.pages)
+              for t in mock.page(query[0], p)['data']]
+    first_len = len(mock.page(query[0], 0)['data'])
+
+    # interrupted within the first page, which has no token: the rest of it
+    #   is requested below the last saved tweet
+    assert con.paginate(save_path, query, batch_size=7, num_batches=2) == 2
+    checkpoint = Checkpoint.load(save_path, query)
+    assert (checkpoint.next_token, checkpoint.skip, checkpoint.until_id) == \
+           (None, 0, stream[13])
+    assert (checkpoint.tokens, checkpoint.finished) == (14, False)
+
+    # interrupted within the second page: its leading tweets are skipped
+    assert con.paginate(save_path, query, batch_size=7, num_batches=4,
+                        resume=True) == 4
+    checkpoint = Checkpoint.load(save_path, query)
+    assert (checkpoint.next_token, checkpoint.skip, checkpoint.until_id) == \
+           ('p1', 28 - first_len, stream[13])
+
+    batches = con.paginate(save_path, query, batch_size=7, num_batches=100,
+                           resume=True)
+    checkpoint = Checkpoint.load(save_path, query)
+    assert (checkpoint.next_token, checkpoint.until_id) == (None, None)
+    assert checkpoint.finished and (checkpoint.batches == batches)
+
+    sep = configs.read_conf()['csv_sep']
+    saved = [pd.read_csv(save_path / p, sep=sep, dtype={'id': str})['id']
+             .tolist() for p in checkpoint.saved if p.startswith('tweets')]
+    # exactly batch_size tweets per batch but the last, none lost or repeated
+    assert [len(ids) for ids in saved] == \
+           [7] * (len(stream) // 7) + [len(stream) % 7]
+    assert sum(saved, []) == stream
+    con.close()
+
+
+def test_harvest_budget_resume(mock, query, save_path):
+    con = TwitterConnection('es', key='test', host=mock.url)
+    pages = [mock.page(query[0], p) for p in range(mock.pages)]
+    stream = [t['id'] for p in pages for t in p['data']]
+
+    # the budget runs out after two pages; both are saved
+    harvester = Harvester(con, max_concurrent=1, request_budget=2)
+    fetched = len(pages[0]['data']) + len(pages[1]['data'])
+    assert harvester.run(save_path, [query], batch_size=10,
+                         num_batches=100) == {query[0]: -(-fetched // 10)}
+    assert harvester.requests_left == 0
+    checkpoint = Checkpoint.load(save_path, query)
+    assert (checkpoint.next_token, checkpoint.skip) == \
+           (pages[1]['meta']['next_token'], 0)
+    assert (checkpoint.tokens, checkpoint.finished) == (fetched, False)
+
+    # a resumed harvest picks up from the checkpoint
+    harvester = Harvester(con, max_concurrent=1, request_budget=10)
+    batches = harvester.run(save_path, [query], batch_size=10,
+                            num_batches=100, resume=True)[query[0]]
+    assert harvester.requests_made == mock.pages - 2
+    checkpoint = Checkpoint.load(save_path, query)
+    assert checkpoint.finished and (checkpoint.batches == batches)
+
+    sep = configs.read_conf()['csv_sep']
+    saved = [pd.read_csv(save_path / p, sep=sep, dtype={'id': str})['id']
+             .tolist() for p in checkpoint.saved if p.startswith('tweets')]
+    assert sum(saved, []) == stream
+    con.close()
+
+
+def test_harvest_concurrency(save_path):
+    queries = [(q, q) for q in ['parecer', 'creer', 'pensar', 'decir']]
+    in_flight, peak = [0], [0]
+    lock = threading.Lock()
+
+    with MockTwitterServer(pages=2, page_size=20, latency=0.05) as server, \
+            TwitterConnection('es', key='test', host=server.url) as con:
+        connect = con.connect
+
+        def counting_connect(*args):
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            try:
+                return connect(*args)
+            finally:
+                with lock:
+                    in_flight[0] -= 1
+
+        con.connect = counting_connect
+        saved = Harvester(con, max_concurrent=2).run(
+            save_path, queries, batch_size=10, num_batches=1
+        )
+
+    # every query got its batch, never more than two of them in flight
+    assert saved == {q[0]: 1 for q in queries}
+    assert peak[0] == 2
+
+
+def test_batch_writer_order():
+    written = []
+
+    def write(batch_num):
+        # earlier batches take longer, so a reordering would show
+        sleep(0.01 * (5 - batch_num))
+        written.append(batch_num)
+
+    with BatchWriter(max_pending=1) as writer:
+        for batch_num in range(5):
+            writer.submit(write, batch_num)
+
+    assert written == list(range(5))
+
+
+def test_batch_writer_error():
+    written = []
+
+    def write(batch_num):
+        if batch_num == 2:
+            raise OSError('disk full')
+        written.append(batch_num)
+
+    # raised by close(); the jobs after the failed one are dropped
+    writer = BatchWriter()
+    for batch_num in range(5):
+        writer.submit(write, batch_num)
+    with pytest.raises(RuntimeError) as error:
+        writer.close()
+    assert isinstance(error.value.__cause__, OSError)
+    assert written == [0, 1]
+
+    # or by the next submit()
+    failed = threading.Event()
+
+    def fail():
+        failed.set()
+        raise OSError('disk full')
+
+    writer = BatchWriter()
+    writer.submit(fail)
+    failed.wait()
+    # give the writer thread a moment to record the error
+    sleep(0.1)
+    with pytest.raises(RuntimeError):
+        writer.submit(write, 0)
+    writer.close()
+
+
+def test_key_pool_acquire():
+    pool = KeyPool(['a', 'b', 'c'], {k: {'key': k} for k in 'abc'})
+    now = int(time())
+
+    # nothing known: the key listed first
+    assert pool.acquire()[:2] == ('a', {'key': 'a'})
+
+    # the one with the most quota left
+    pool.limiters['a'].update({'x-rate-limit-limit': '10',
+                               'x-rate-limit-remaining': '3',
+                               'x-rate-limit-reset': str(now + 60)})
+    assert pool.acquire()[0] == 'b'
+
+    # all spent: the one resetting soonest
+    for k, reset in zip('abc', [60, 20, 40]):
+        pool.limiters[k].update({'x-rate-limit-remaining': '0',
+                                 'x-rate-limit-reset': str(now + reset)})
+    assert not pool.has_quota()
+    assert pool.acquire()[0] == 'b'
+    assert 18 < pool.next_reset() <= 20
+
+
+def test_pooled_retry_delay(monkeypatch):
+    monkeypatch.setenv('A_KEY', 'a')
+    monkeypatch.setenv('B_KEY', 'b')
+    con = PooledConnection('es', ['a', 'b'])
+    limiters = con.pool.limiters
+
+    # a 429 without quota headers benches the key; the other takes over
+    assert con._retry_delay(limiters['a'], response(429), 0) == 0
+    assert con.pool.acquire()[0] == 'b'
+
+    # both benched: wait until the first one may be used again
+    delay = con._retry_delay(limiters['b'], response(429), 2)
+    assert 0 < delay <= limiters['a'].backoff_base
+    assert con.pool.acquire()[0] == 'a'
+
+    # not throttled: plain backoff, the key stays in use
+    assert con._retry_delay(limiters['a'], response(503), 1) == \
+        2 * limiters['a'].backoff_base
+    con.close()
+
+
+def test_pooled_rotation(monkeypatch, query):
+    monkeypatch.setenv('A_KEY', 'a')
+    monkeypatch.setenv('B_KEY', 'b')
+
+    # the third request throttled (asked to wait a second)
+    with MockTwitterServer(pages=4, page_size=10, latency=0,
+                           fail_every=3) as server, \
+            PooledConnection('es', ['a', 'b'], host=server.url) as con:
+        start = perf_counter()
+        token = None
+        for _ in range(4):
+            token = con.fetch(query, token)['meta'].get('next_token')
+
+        # the throttled request went to the other key without waiting
+        assert perf_counter() - start < 1
+        assert (server.requests, server.throttled) == (5, 1)
+        usage = con.pool.usage()
+        assert sorted(u['throttled'] for u in usage.values()) == [0, 1]
+        assert all(u['requests'] > 1 for u in usage.values())
+
+
+def test_connection_reuse(query):
+    with MockTwitterServer(pages=3, page_size=10, latency=0) as server, \
+            TwitterConnection('es', key='test', host=server.url) as con:
+        token = None
+        for _ in range(3):
+            token = con.fetch(query, token)['meta'].get('next_token')
+
+        # every request went over a single pooled connection
+        assert (server.requests, server.connections) == (3, 1)
+
+
+def test_fetch_retry_network_errors(monkeypatch, mock, query):
+    sleeps = []
+    monkeypatch.setattr(connection, 'sleep', sleeps.append)
+    con = TwitterConnection('es', key='test', host=mock.url,
+                            limiter=RateLimiter(max_retries=2, backoff_base=1))
+    get = con.session.get
+    errors = [requests.exceptions.Timeout(),
+              requests.exceptions.ConnectionError()]
+
+    def flaky_get(*args, **kwargs):
+        if errors:
+            raise errors.pop(0)
+        return get(*args, **kwargs)
+
+    # timeouts and dropped connections are retried with backoff
+    monkeypatch.setattr(con.session, 'get', flaky_get)
+    assert con.fetch(query)['data'] == mock.page(query[0], 0)['data']
+    assert sleeps == [1, 2]
+
+    # until the retries run out
+    errors.extend([requests.exceptions.Timeout()] * 3)
+    with pytest.raises(requests.exceptions.Timeout):
+        con.fetch(query)
+    assert sleeps == [1, 2, 1, 2]
+    con.close()
+
+
+def test_journal_replay(tmp_path, query):
+    path = tmp_path / 'journal.ndjson.gz'
+
+    # two runs of the same query, whose pages hold different tweets
+    with ResponseJournal(path) as journal:
+        for page_size in (10, 20):
+            with MockTwitterServer(pages=3, page_size=page_size) as server:
+                tokens = [None, 'p1', 'p2']
+                for num, token in enumerate(tokens):
+                    journal.append('es', query, server.page(query[0], num),
+                                   token)
+                # a resumed run requests its last page again
+                last = server.page(query[0], 2)
+        journal.append('es', query, last, 'p2')
+
+    replayed = list(replay(path))
+
+    assert journal.pages == 7
+    assert len(replayed) == 6
+    assert [r.next_token for r in replayed] == ['p1', 'p2', None] * 2
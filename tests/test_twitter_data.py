@@ -1,5 +1,9 @@
 from src.twitter_data import tweets
+from id_store import IdStore
+from text_cache import TextCache
 import files
+import pandas as pd
+from pathlib import Path
 import pytest
 
 
@@ -71,6 +75,75 @@ def test_update_ids(id_keeping_paths, id_keeping_objects):
     assert written_ids == actual_ids
 
 
+def test_update_ids_store(tmp_path, id_keeping_paths):
+    data_path, ids_existing_path, _, ids_actual_path = id_keeping_paths
+    data = tweets.Tweets.from_csv(data_path, 'es', topic='actual')
+    actual_ids = [int(i) for i in ids_actual_path.read_text().split()]
+
+    existing = IdStore.from_text(ids_existing_path, tmp_path / 'existing')
+    data.update_ids(tmp_path / 'existing', tmp_path / 'new')
+    written = IdStore(tmp_path / 'new')
+
+    assert len(written) == len(actual_ids)
+    assert written.contains(actual_ids).all()
+    # only the records not already in the store are kept
+    assert not existing.contains(data.d['id'].to_numpy()).any()
+
+
+def test_stream_update_ids(tmp_path, id_keeping_paths):
+    from twitter_data import stream_update_ids
+
+    data_path, ids_existing_path, _, ids_actual_path = id_keeping_paths
+    data = tweets.Tweets.from_csv(data_path, 'es', topic='actual')
+    IdStore.from_text(ids_existing_path, tmp_path / 'existing')
+    data.update_ids(tmp_path / 'existing', tmp_path / 'whole')
+
+    # every chunk repeats the rows of the one before it
+    chunks = tweets.Tweets.iter_csv(data_path, 'es', topic='actual',
+                                    chunksize=5)
+    repeated = (tweets.Tweets(pd.concat([prev.d, c.d]), 'actual', 'es')
+                for prev, c in _pairs(chunks))
+    streamed = pd.concat([c.d for c in stream_update_ids(
+        repeated, tmp_path / 'existing', tmp_path / 'new'
+    )], ignore_index=True)
+
+    assert streamed['id'].tolist() == data.d['id'].unique().tolist()
+    assert (IdStore(tmp_path / 'new').to_array()
+            == IdStore(tmp_path / 'whole').to_array()).all()
+    # the read store is left as it was
+    assert len(IdStore(tmp_path / 'existing')) == \
+        len(set(ids_existing_path.read_text().split()))
+
+
+def _pairs(chunks):
+    """Each chunk of @chunks along with the one before it"""
+    prev = None
+    for c in chunks:
+        yield (prev if prev is not None else c), c
+        prev = c
+
+
+def test_update_ids_places(tmp_path):
+    from places import Places
+
+    # place ids are hexadecimal strings, kept in a text id file
+    data = Places(pd.DataFrame({
+        'id': pd.array(['791474c5b53dfdd8', '01a9a39529b27f36',
+                        '00a8b25e420adc94'], dtype='string'),
+        'full_name': ['Madrid, España', 'Lima, Perú', 'Quito, Ecuador']
+    }), 'places', 'es')
+    (tmp_path / 'places.txt').write_text('791474c5b53dfdd8 0a1b2c3d4e5f6a7b')
+
+    data.update_ids(tmp_path / 'places.txt', tmp_path / 'new.txt')
+
+    assert data.d['id'].tolist() == ['01a9a39529b27f36', '00a8b25e420adc94']
+    assert set((tmp_path / 'new.txt').read_text().split()) == {
+        '791474c5b53dfdd8', '0a1b2c3d4e5f6a7b', '01a9a39529b27f36',
+        '00a8b25e420adc94'}
+    with pytest.raises(ValueError):
+        data.update_ids(tmp_path / 'store')
+
+
 def test_remove_ids():
     pass
 
@@ -85,6 +158,160 @@ def test_write_read_ids(id_keeping_paths, id_keeping_objects):
     assert data_ids == read_ids
 
 
+def test_iter_csv(id_keeping_paths):
+    data_path, _, _, _ = id_keeping_paths
+    data = tweets.Tweets.from_csv(data_path, 'es', topic='actual')
+
+    chunks = list(tweets.Tweets.iter_csv(data_path, 'es', topic='actual',
+                                         chunksize=5))
+    streamed = pd.concat([c.d for c in chunks], ignore_index=True)
+
+    assert [c.shape[0] for c in chunks] == [5, 5, 3]
+    assert streamed.equals(data.d)
+
+
+def test_decode_rename():
+    from decoder import Decoder
+
+    records = [
+        {'id': '1', 'text': 'hola @ana', 'author_id': '7',
+         'referenced_tweets': [{'type': 'quoted', 'id': '3'}],
+         'entities': {'mentions': [{'start': 5, 'end': 9, 'username': 'ana'}]}},
+        {'id': '2', 'text': 'adiós', 'author_id': '8',
+         'geo': {'place_id': '791474c5b53dfdd8'}}
+    ]
+    decoded = Decoder('tweets', rename=True).decode(records)
+
+    assert list(decoded.columns) == ['tweet_id', 'text_orig', 'user_id',
+                                     'referenced_tweets', 'tweet_place_id',
+                                     'mentions']
+    assert str(decoded['tweet_id'].dtype) == 'UInt64'
+    # lists keep their structure whatever the renamed column's dtype
+    assert decoded['mentions'].tolist() == [
+        [{'start': 5, 'end': 9, 'username': 'ana'}], None]
+    assert decoded['referenced_tweets'][0] == [{'type': 'quoted', 'id': '3'}]
+
+
+def test_normalize_texts():
+    from unidecode import unidecode
+
+    texts = pd.Series(['@user hola\tmundo', 'sí 👍🏽 @Ñandú qué',
+                       'ver:🇦🇷❤️\n\nção', 'sí 👍🏽 @Ñandú qué', None],
+                      dtype='string')
+
+    normed = tweets.normalize_texts(texts)
+    per_row = texts.iloc[:-1].apply(tweets.Tweets.norm_text).apply(unidecode)
+
+    assert normed.iloc[:-1].tolist() == per_row.tolist()
+    # mentions and emoji stripped, the rest of the text kept
+    assert per_row.tolist() == ['hola mundo', 'si  que', 'ver: cao', 'si  que']
+    assert normed.iloc[-1] is pd.NA
+
+
+def test_text_cache(tmp_path):
+    texts = pd.Series(['@user hola\tmundo', 'sí 👍🏽 qué', 'sí 👍🏽 qué'],
+                      dtype='string')
+    cache = TextCache(tmp_path / 'cache.sqlite', max_bytes=10**6)
+
+    cold = tweets.normalize_texts(texts, cache=cache)
+    warm = tweets.normalize_texts(texts, cache=cache)
+    stats = cache.stats()
+
+    assert cold.equals(warm)
+    assert (stats['hits'], stats['misses'], stats['entries']) == (2, 2, 2)
+    # entries of another normalizer version are never returned
+    assert TextCache(tmp_path / 'cache.sqlite', version=2) \
+        .get_many(['sí 👍🏽 qué']) == [None]
+
+    # texts already cached (or repeated) add no bytes
+    size = 'SELECT total(size) FROM entries'
+    assert cache.stats()['bytes'] == cache._conn.execute(size).fetchone()[0]
+    cache.put_many(['x', 'x', 'sí 👍🏽 qué'], ['x', 'x', 'sí qué'])
+    assert cache.stats()['bytes'] == cache._conn.execute(size).fetchone()[0]
+
+    cache.evict(0)
+    assert (len(cache), cache.stats()['bytes']) == (0, 0)
+
+
+def test_stream_normalize_cache(tmp_path, monkeypatch, id_keeping_paths):
+    opened = []
+
+    class Cache(TextCache):
+        def __init__(self, version):
+            super().__init__(tmp_path / 'cache.sqlite', version)
+            self.closed = False
+            opened.append(self)
+
+        def close(self):
+            self.closed = True
+            super().close()
+
+    monkeypatch.setitem(tweets.gconf['text_cache'], 'enabled', True)
+    monkeypatch.setattr(tweets, 'TextCache', Cache)
+    chunks = tweets.Tweets.iter_csv(id_keeping_paths[0], 'es',
+                                    topic='actual', chunksize=5)
+
+    normed = [c.d['text_norm'] for c in tweets.Tweets.stream_normalize(chunks)]
+
+    # a single cache for every chunk, closed once they are consumed
+    assert len(normed) == 3
+    assert len(opened) == 1 and opened[0].closed
+    # the texts repeated by later chunks are found in it
+    assert (opened[0].misses, opened[0].hits) == \
+        (pd.concat(normed).nunique(), 3)
+
+    # a cache passed in is left open
+    cache = TextCache(tmp_path / 'cache.sqlite')
+    data = tweets.Tweets.from_csv(id_keeping_paths[0], 'es', topic='actual')
+    data.normalize(cache=cache)
+    assert cache.stats()['misses'] == 0 and len(cache) > 0
+    cache.close()
+
+
+def test_save_excel_lists(sample_paths):
+    import tempfile
+
+    # decoded tweets hold lists and dicts (eg. 'entities.mentions')
+    data = tweets.Tweets(pd.DataFrame({
+        'id': pd.array([1, 2], dtype='UInt64'),
+        'mentions': [['ana', 'luis'], None],
+        'referenced_tweets': [[{'type': 'quoted', 'id': '3'}], []]
+    }), 'parecer', 'es')
+
+    # saved within the project, as save() logs paths relative to its root
+    with tempfile.TemporaryDirectory(dir=sample_paths[1]) as tmp:
+        path = data.save(Path(tmp), 'excel', name_scheme='lists')[0]
+        read = pd.read_excel(path)
+
+    assert read['mentions'].tolist()[0] == "['ana', 'luis']"
+    assert pd.isna(read['mentions'].tolist()[1])
+    assert read['referenced_tweets'].tolist() == \
+        ["[{'type': 'quoted', 'id': '3'}]", '[]']
+
+
+def test_dataset_query_ids(sample_paths):
+    import tempfile
+    from dataset import Dataset
+
+    with_ids = tweets.Tweets(pd.DataFrame({
+        'id': pd.array([1455304983897788417, 1455304983897788419],
+                       dtype='UInt64'),
+        'text_orig': ['hola', 'adiós']
+    }), 'parecer', 'es')
+    without_ids = tweets.Tweets(pd.DataFrame({'text_orig': ['qué']}),
+                                'parecer', 'es')
+
+    with tempfile.TemporaryDirectory(dir=sample_paths[1]) as tmp:
+        data = Dataset(Path(tmp))
+        data.write(with_ids, 'extracted', date='2023-02-08')
+        data.write(without_ids, 'extracted', date='2023-02-08')
+
+        # ids are compared exactly, not as floats
+        assert data.manifest['id_max'].tolist() == [1455304983897788419, None]
+        assert data.query(ids=[1455304983897788419])['rows'].tolist() == [2, 1]
+        assert data.query(ids=[1455304983897788420])['rows'].tolist() == [1]
+
+
 def test_save(sample_paths, tweet_object):
     t_path, sample_path, e_path, c_path = sample_paths
     d = tweet_object